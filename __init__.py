@@ -1,3 +1,12 @@
+import time
+
+
 def classFactory(iface):
+    # Tempos de arranque do plugin (ver RasterEditPlugin.report_startup)
+    start = time.perf_counter()
     from .rasteredition import RasterEditPlugin
-    return RasterEditPlugin(iface)
\ No newline at end of file
+    imported = time.perf_counter()
+    plugin = RasterEditPlugin(iface)
+    plugin.startup_times['import'] = imported - start
+    plugin.startup_times['init'] = time.perf_counter() - imported
+    return plugin
@@ -0,0 +1,116 @@
+"""
+Edição em lote a partir de uma camada vetorial de polígonos.
+
+As janelas (em píxeis) dos polígonos são agrupadas pelo mosaico do raster
+que contém o seu centro. Cada grupo é lido uma única vez, recebe todas as
+edições dos seus polígonos, pela ordem da camada, e é escrito uma única vez.
+
+Este módulo não depende do QGIS.
+"""
+
+# Lado (píxeis) dos mosaicos usados para agrupar os polígonos
+BATCH_TILE_SIZE = 2048
+
+SUPPRESS = 'suppress'
+INTERPOLATE = 'interpolate'
+INTERPOLATE_ALL = 'interpolate_all'
+
+# Operações disponíveis, pelo nome mostrado na interface
+BATCH_OPERATIONS = {
+    'Suppress': SUPPRESS,
+    'Interpolate NoData': INTERPOLATE,
+    'Interpolate All': INTERPOLATE_ALL,
+}
+
+
+def group_windows(windows, tile_size=BATCH_TILE_SIZE):
+    """
+    Agrupa janelas (x_min, y_min, x_max, y_max), inclusivas, pelo mosaico que
+    contém o seu centro.
+
+    Devolve uma lista de (janela do grupo, índices das janelas), ordenada por
+    linha e coluna do mosaico; a janela do grupo envolve todas as suas janelas.
+    """
+    groups = {}
+    for index, (x_min, y_min, x_max, y_max) in enumerate(windows):
+        key = ((y_min + y_max) // 2 // tile_size, (x_min + x_max) // 2 // tile_size)
+        groups.setdefault(key, []).append(index)
+
+    result = []
+    for key in sorted(groups):
+        indices = groups[key]
+        window = (
+            min(windows[i][0] for i in indices),
+            min(windows[i][1] for i in indices),
+            max(windows[i][2] for i in indices),
+            max(windows[i][3] for i in indices),
+        )
+        result.append((window, indices))
+    return result
+
+
+def group_features(window, indices, windows, rings, geotransform):
+    """
+    Polígonos de um grupo no formato de apply_features: janelas relativas ao
+    bloco do grupo `window` e geotransform de cada janela, a partir do
+    geotransform do raster (píxel 0, 0).
+    """
+    x_min, y_min = window[0], window[1]
+    features = []
+    for i in indices:
+        fx_min, fy_min, fx_max, fy_max = windows[i]
+        features.append({
+            'window': (fx_min - x_min, fy_min - y_min, fx_max - x_min + 1, fy_max - y_min + 1),
+            'rings': rings[i],
+            'geotransform': (geotransform[0] + fx_min * geotransform[1], geotransform[1], 0.0,
+                             geotransform[3] + fy_min * geotransform[5], 0.0, geotransform[5])
+        })
+    return features
+
+
+def apply_features(array, features, no_data_value, operation, settings=None, checkpoint=None):
+    """
+    Aplica em `array` (bloco de um grupo, no tipo nativo, alterado no próprio
+    lugar) a operação a cada polígono de `features`, por ordem. O bloco pode
+    ter várias bandas (3D, bandas primeiro), com um valor NoData por banda.
+
+    Cada elemento de `features` é um dicionário com 'window' (coluna e linha
+    iniciais e finais, exclusivas, relativas ao bloco), 'rings' (anéis em
+    coordenadas de mapa) e 'geotransform' (da janela). `settings` são as
+    opções de interpolate_polygon, incluindo 'method'. Os polígonos sem
+    anéis e os que não podem ser interpolados (p.ex. sem píxeis válidos à
+    volta) são ignorados.
+
+    Devolve (polígonos editados, píxeis alterados, polígonos ignorados).
+    """
+    from .engine import interpolate, suppress
+
+    settings = dict(settings or {}, all_values=operation == INTERPOLATE_ALL)
+    checkpoint = checkpoint or (lambda progress: None)
+    edited = pixels = failed = 0
+    total = len(features)
+
+    for done, feature in enumerate(features):
+        c0, r0, c1, r1 = feature['window']
+        window = array[..., r0:r1, c0:c1]
+        if not feature['rings']:
+            # Sem anéis o motor editaria a janela inteira
+            failed += 1
+            continue
+        if operation == SUPPRESS:
+            result, changed = suppress(window, feature['geotransform'], feature['rings'], no_data_value)
+        else:
+            try:
+                result, changed = interpolate(
+                    window, feature['geotransform'], feature['rings'], no_data_value,
+                    checkpoint=lambda progress: checkpoint(100 * (done + progress / 100) / total),
+                    **settings
+                )
+            except ValueError:
+                failed += 1
+                continue
+        window[changed] = result[changed]
+        edited += 1
+        pixels += int((changed.any(axis=0) if changed.ndim == 3 else changed).sum())
+        checkpoint(100 * (done + 1) / total)
+    return edited, pixels, failed
@@ -0,0 +1,322 @@
+"""
+Benchmarks dos caminhos críticos da edição (sem QGIS).
+
+Mede o tempo (mínimo de várias repetições) e o pico de memória de cada
+etapa - supressão, interpolação de NoData, interpolação de todos os valores,
+registo de UNDO e ida e volta UNDO/REDO - para combinações de tamanho do
+raster, tipo de dados, complexidade do polígono, fração de buracos e método
+de interpolação. O pico de memória é medido de duas formas: memória Python
+(tracemalloc, sem as alocações em C como a triangulação do Qhull) e aumento
+da memória residente do processo. Os resultados são exportados em JSON para
+comparar versões no mesmo equipamento.
+
+Uso:
+    python benchmarks/run.py --sizes 256 1024 4096 --output results.json
+"""
+import argparse
+import ctypes
+import gc
+import importlib
+import itertools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+import types
+
+import numpy as np
+import scipy
+# Importados aqui para que o custo (e a memória) da importação não conte na primeira etapa
+import scipy.interpolate
+import scipy.ndimage
+import scipy.spatial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_plugin_modules():
+    """
+    Importa os módulos do motor sem executar o __init__ do plugin (que
+    depende do QGIS), registando o diretório do repositório como pacote.
+    """
+    package = types.ModuleType('rasteredit')
+    package.__path__ = [ROOT]
+    sys.modules.setdefault('rasteredit', package)
+    return (importlib.import_module('rasteredit.engine'),
+            importlib.import_module('rasteredit.history'),
+            importlib.import_module('rasteredit.interpolation'))
+
+
+engine, history, interpolation = load_plugin_modules()
+
+STAGES = ('suppress', 'interpolate', 'interpolate_all', 'save_state', 'undo_redo')
+NO_DATA = {'float32': -9999.0, 'float64': -9999.0, 'int16': -32768, 'uint16': 0, 'uint8': 0}
+# Tipo QGIS fictício: os registos só o guardam
+DATA_TYPE = 0
+
+
+def make_raster(size, dtype, rng):
+    """Superfície suave com ruído, no tipo `dtype`, e o seu geotransform."""
+    y, x = np.mgrid[0:size, 0:size] / size
+    surface = np.sin(6 * x) * np.cos(4 * y) + 0.05 * rng.standard_normal((size, size))
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        low, high = max(info.min + 1, -1000), min(info.max, 1000)
+        surface = low + (surface - surface.min()) / np.ptp(surface) * (high - low)
+    array = surface.astype(dtype)
+    geotransform = (500000.0, 1.0, 0.0, 4000000.0 + size, 0.0, -1.0)
+    return array, geotransform
+
+
+def make_polygon(size, vertices, fraction, geotransform):
+    """
+    Polígono em estrela com `vertices` vértices centrado no raster; o raio
+    exterior é `fraction` de metade do lado do raster.
+    """
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radius = np.where(np.arange(vertices) % 2, 0.75, 1.0) * fraction * size / 2
+    cols = size / 2 + radius * np.cos(angles)
+    rows = size / 2 + radius * np.sin(angles)
+    return [(geotransform[0] + c * geotransform[1], geotransform[3] + r * geotransform[5])
+            for c, r in zip(cols, rows)]
+
+
+def punch_holes(array, mask, fraction, no_data, rng):
+    """Abre buracos NoData em discos dentro de `mask` até `fraction` da sua área."""
+    holed = array.copy()
+    rows, cols = np.nonzero(mask)
+    if fraction <= 0 or len(rows) == 0:
+        return holed
+    target = fraction * len(rows)
+    radius = max(2, int(np.sqrt(target / np.pi / 8)))
+    y, x = np.ogrid[0:array.shape[0], 0:array.shape[1]]
+    holes = np.zeros(array.shape, dtype=bool)
+    while (holes & mask).sum() < target:
+        i = rng.integers(len(rows))
+        holes |= (y - rows[i]) ** 2 + (x - cols[i]) ** 2 <= radius ** 2
+    holed[holes & mask] = no_data
+    return holed
+
+
+def current_rss():
+    """Memória residente atual do processo (bytes), ou None se não for possível medi-la."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def release_memory():
+    """
+    Devolve ao sistema a memória livre do alocador (glibc), para que o
+    aumento da memória residente de cada execução não seja escondido pela
+    memória libertada pela anterior.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class RssSampler:
+    """
+    Amostra a memória residente numa thread durante um bloco `with` e guarda
+    o maior aumento em relação ao início. Ao contrário do tracemalloc, inclui
+    as alocações em C (p.ex. a triangulação do Qhull).
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = None
+
+    def __enter__(self):
+        release_memory()
+        self._base = current_rss()
+        self._stop = threading.Event()
+        self._thread = None
+        if self._base is not None:
+            self.peak = 0
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._record()
+        return False
+
+    def _record(self):
+        self.peak = max(self.peak, current_rss() - self._base)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._record()
+
+
+def measure(function, repeat):
+    """
+    Tempos de `repeat` execuções, maior aumento da memória residente (ver
+    RssSampler) de mais uma e pico de memória Python (tracemalloc) de outra.
+    As medições de memória são feitas à parte para não afetar os tempos.
+    """
+    times = []
+    for _ in range(repeat):
+        interpolation.triangulation_cache.clear()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    interpolation.triangulation_cache.clear()
+    with RssSampler() as sampler:
+        function()
+    interpolation.triangulation_cache.clear()
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, times, peak, sampler.peak
+
+
+def run_case(size, dtype, vertices, hole_fraction, args, rng):
+    """Executa todas as etapas pedidas para um raster e um polígono."""
+    array, geotransform = make_raster(size, dtype, rng)
+    no_data = NO_DATA[dtype]
+    ring = make_polygon(size, vertices, args.polygon_fraction, geotransform)
+    mask = engine.zone_mask(ring, geotransform, array.shape)
+    holed = punch_holes(array, mask, hole_fraction, no_data, rng)
+    base = {'size': size, 'dtype': dtype, 'vertices': vertices, 'hole_fraction': hole_fraction,
+            'polygon_pixels': int(mask.sum()), 'nodata_pixels': int((holed == no_data).sum())}
+    options = {'ring_width': args.ring_width, 'tiled': args.tiled, 'tile_size': args.tile_size,
+               'halo': args.halo, 'precision': args.precision, 'workers': args.workers,
+               'idw_power': args.idw_power, 'idw_neighbors': args.idw_neighbors, 'idw_radius': args.idw_radius}
+    results = []
+
+    def report(stage, times, peak, peak_rss, changed=None, **extra):
+        entry = dict(base, stage=stage, **extra, wall_s=min(times), wall_all_s=times,
+                     peak_python_bytes=peak, peak_rss_bytes=peak_rss)
+        if changed is not None:
+            entry['changed_pixels'] = int(changed.sum())
+        results.append(entry)
+        label = extra.get('method', '') + (' tiled' if extra.get('tiled') else '')
+        print(f"{stage:16s} {size:6d}² {dtype:8s} v={vertices:<5d} holes={hole_fraction:<5g} {label:14s}"
+              f"{min(times):10.4f} s {peak / 1024 ** 2:10.1f} MiB py"
+              + (f" {peak_rss / 1024 ** 2:10.1f} MiB rss" if peak_rss is not None else ""), flush=True)
+
+    edited = None
+    if 'suppress' in args.stages:
+        (edited, changed), times, peak, peak_rss = measure(
+            lambda: engine.suppress(array, geotransform, ring, no_data), args.repeat)
+        report('suppress', times, peak, peak_rss, changed)
+
+    for method in args.methods:
+        for stage, source, all_values in (('interpolate', holed, False), ('interpolate_all', array, True)):
+            if stage not in args.stages:
+                continue
+            try:
+                (edited, changed), times, peak, peak_rss = measure(
+                    lambda: engine.interpolate(source, geotransform, ring, no_data, method=method,
+                                               all_values=all_values, **options),
+                    args.repeat)
+            except ValueError as e:
+                print(f"{stage:16s} {size:6d}² {dtype:8s} method={method}: skipped ({e})", flush=True)
+                continue
+            report(stage, times, peak, peak_rss, changed, method=method, **options)
+
+    if edited is None:
+        edited = engine.suppress(array, geotransform, ring, no_data)[0]
+    changed = history.changed_mask(array, edited)
+
+    if 'save_state' in args.stages:
+        def save_state():
+            store = history.HistoryStore()
+            stack = history.HistoryStack(store)
+            stack.append(history.make_record(0, 0, array, edited, DATA_TYPE, changed))
+            return stack
+        stack, times, peak, peak_rss = measure(save_state, args.repeat)
+        report('save_state', times, peak, peak_rss, changed, record_bytes=history.record_nbytes(stack[-1]))
+        stack.clear()
+
+    if 'undo_redo' in args.stages:
+        record = history.make_record(0, 0, array, edited, DATA_TYPE, changed)
+
+        def undo_redo():
+            # Janela do registo, como lida do raster editado em apply_state
+            window = edited[record['y_min']:record['y_min'] + record['n_rows'],
+                            record['x_min']:record['x_min'] + record['n_cols']].copy()
+            redo = history.swap_record(window, record)
+            history.swap_record(window, redo)
+        _, times, peak, peak_rss = measure(undo_redo, args.repeat)
+        report('undo_redo', times, peak, peak_rss, changed)
+
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 1024, 2048],
+                        help="raster side lengths in pixels (e.g. 256 1024 4096 8192)")
+    parser.add_argument('--dtypes', nargs='+', default=['float32', 'int16'], choices=sorted(NO_DATA))
+    parser.add_argument('--vertices', type=int, nargs='+', default=[8, 512],
+                        help="polygon complexity (number of vertices)")
+    parser.add_argument('--holes', type=float, nargs='+', default=[0.05, 0.25],
+                        help="fraction of the polygon that is NoData before Interpolate NoData")
+    parser.add_argument('--methods', nargs='+', default=list(interpolation.METHODS),
+                        choices=list(interpolation.METHODS))
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES)
+    parser.add_argument('--polygon-fraction', type=float, default=0.5,
+                        help="polygon radius as a fraction of half the raster side")
+    parser.add_argument('--ring-width', type=int, default=8, help="support ring width (0 = whole block)")
+    parser.add_argument('--tiled', action='store_true', help="use tiled interpolation")
+    parser.add_argument('--tile-size', type=int, default=interpolation.DEFAULT_TILE_SIZE)
+    parser.add_argument('--halo', type=int, default=interpolation.DEFAULT_TILE_HALO)
+    parser.add_argument('--precision', default='auto', choices=interpolation.PRECISIONS)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--idw-power', type=float, default=interpolation.DEFAULT_IDW_POWER)
+    parser.add_argument('--idw-neighbors', type=int, default=interpolation.DEFAULT_IDW_NEIGHBORS)
+    parser.add_argument('--idw-radius', type=float, default=interpolation.DEFAULT_IDW_RADIUS,
+                        help="IDW search radius in pixels (0 = unlimited)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage (the minimum is reported)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark-results.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for size, dtype, vertices, holes in itertools.product(args.sizes, args.dtypes, args.vertices, args.holes):
+        results.extend(run_case(size, dtype, vertices, holes, args, rng))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'arguments': vars(args),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"{len(results)} results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Motor de edição de blocos raster.
+
+Cada operação recebe um bloco NumPy no tipo nativo do raster, o seu
+geotransform (convenção GDAL) e os vértices do polígono em coordenadas de
+mapa, e devolve um novo bloco e a máscara dos píxeis alterados. A leitura e a
+escrita dos blocos e a interface ficam do lado do plugin, pelo que o motor
+pode correr, ser medido e ser otimizado em processos Python simples ou em
+conjuntos de processos.
+
+Este módulo não depende do QGIS.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from .history import changed_mask
+from .interpolation import TriangulationCache, interpolate_polygon
+from .masking import polygon_mask, rings_mask, suppress_array
+from .tracing import span
+
+# Triangulações de buracos ou mosaicos partilhadas entre bandas guardadas, por worker
+BAND_CACHE_PER_WORKER = 4
+
+
+def zone_mask(vertices, geotransform, shape):
+    """
+    Máscara booleana da zona a editar. `vertices` é um anel [(x, y), ...] ou
+    uma lista de anéis (exteriores e interiores, combinados por par-ímpar).
+    """
+    with span('mask', vertices=len(vertices)) as s:
+        if len(vertices) and len(vertices[0]) and np.ndim(vertices[0][0]) > 0:
+            mask = rings_mask(vertices, geotransform, shape)
+        else:
+            mask = polygon_mask(vertices, geotransform, shape)
+        if s:
+            s.set(pixels=int(mask.sum()))
+    return mask
+
+
+def changes(before, after):
+    """Máscara dos píxeis alterados (ver history.changed_mask)."""
+    with span('changed_mask') as s:
+        changed = changed_mask(before, after)
+        if s:
+            s.set(changed=int(changed.sum()))
+    return changed
+
+
+def band_values(array, no_data_value):
+    """
+    Valores NoData por banda de um bloco 2D (uma banda) ou 3D (bandas,
+    linhas, colunas). `no_data_value` é um valor único ou um por banda.
+    """
+    count = array.shape[0] if array.ndim == 3 else 1
+    if np.ndim(no_data_value) == 0:
+        return [no_data_value] * count
+    if len(no_data_value) != count:
+        raise ValueError("One NoData value is required per band.")
+    return list(no_data_value)
+
+
+def suppress(array, geotransform, vertices, no_data_value, checkpoint=None):
+    """
+    Substitui por NoData os píxeis do polígono (todo o bloco se `vertices`
+    estiver vazio). `array` tem uma banda (2D) ou várias (3D, bandas
+    primeiro), com um valor NoData único ou um por banda; a máscara é
+    calculada uma única vez.
+
+    Devolve (bloco editado, máscara dos píxeis alterados, com a forma do bloco).
+    """
+    no_data_values = band_values(array, no_data_value)
+    shape = array.shape[-2:]
+    mask = zone_mask(vertices, geotransform, shape) if len(vertices) else None
+    if checkpoint is not None:
+        checkpoint(50)
+    with span('suppress_array', bytes=array.nbytes, bands=len(no_data_values)):
+        if array.ndim == 2:
+            result = suppress_array(array, mask, no_data_values[0])
+        else:
+            result = np.stack([suppress_array(band, mask, value) for band, value in zip(array, no_data_values)])
+    return result, changes(array, result)
+
+
+def interpolate(array, geotransform, vertices, no_data_value, method='linear', all_values=False,
+                checkpoint=None, workers=1, **options):
+    """
+    Interpola os píxeis NoData do polígono ou, com `all_values`, todos os seus
+    píxeis. `options` são as restantes opções de interpolate_polygon
+    (ring_width, components, tiled, tile_size, halo, precision).
+
+    Com várias bandas (bloco 3D, bandas primeiro) a máscara é calculada uma
+    única vez e as bandas com os mesmos pontos de suporte reutilizam as
+    triangulações umas das outras. Na área inteira a primeira banda é
+    interpolada sozinha e as restantes em paralelo em `workers` threads,
+    reutilizando a triangulação através da cache da sessão. Com buracos
+    independentes (`components`) ou mosaicos (`tiled`) as bandas são
+    resolvidas em simultâneo, repartindo os `workers`, e avançam a par pelos
+    buracos ou mosaicos; a cache desta edição é limitada e cada triangulação
+    é largada assim que todas as bandas a usaram. Com um único worker as
+    bandas são resolvidas uma a uma e só reutilizam o que ainda está na cache.
+
+    Devolve (bloco editado, máscara dos píxeis alterados, com a forma do
+    bloco). Lança ValueError quando não há píxeis válidos para interpolar.
+    """
+    no_data_values = band_values(array, no_data_value)
+    mask = zone_mask(vertices, geotransform, array.shape[-2:])
+    pixel_size = (geotransform[1], -geotransform[5])
+    if array.ndim == 2:
+        with span('interpolate_polygon', method=method, all_values=all_values, pixels=array.size):
+            result = interpolate_polygon(
+                array, mask, no_data_values[0], method, all_values=all_values,
+                pixel_size=pixel_size, workers=workers, checkpoint=checkpoint, **options
+            )
+        return result, changes(array, result)
+
+    count = len(no_data_values)
+    progress = [0.0] * count
+    lock = threading.Lock()
+    together = bool(options.get('tiled') or (options.get('components') and not all_values))
+    cache = None
+    if together:
+        cache = TriangulationCache(maxsize=BAND_CACHE_PER_WORKER * max(workers, 1), uses=count)
+
+    def solve(band, band_workers):
+        def band_checkpoint(value):
+            if checkpoint is not None:
+                with lock:
+                    progress[band] = value
+                    overall = sum(progress) / count
+                checkpoint(overall)
+
+        with span('interpolate_polygon', method=method, all_values=all_values, band=band,
+                  pixels=array[band].size):
+            return interpolate_polygon(
+                array[band], mask, no_data_values[band], method, all_values=all_values,
+                pixel_size=pixel_size, workers=band_workers, checkpoint=band_checkpoint,
+                cache=cache, **options
+            )
+
+    result = np.empty_like(array)
+    if together:
+        bands, band_workers = range(count), max(workers // count, 1)
+    else:
+        result[0] = solve(0, workers)
+        bands, band_workers = range(1, count), 1
+    if len(bands) > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(bands))) as pool:
+            futures = {pool.submit(solve, band, band_workers): band for band in bands}
+            try:
+                for future in as_completed(futures):
+                    result[futures[future]] = future.result()
+            except BaseException:
+                # Não interpolar as bandas restantes (p.ex. cancelamento)
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for band in bands:
+            result[band] = solve(band, workers)
+    return result, changes(array, result)
@@ -0,0 +1,272 @@
+"""
+Registos esparsos de UNDO/REDO.
+
+Cada registo guarda apenas os píxeis efetivamente alterados por uma edição:
+a janela mínima que os contém, os índices planos codificados em sequências
+(run-length) e os valores anteriores desses píxeis. Uma edição de várias
+bandas dá um único registo (atómico): os índices são os da união das
+alterações e os valores têm uma linha por banda. Cada registo leva também
+um resumo (digest) do seu conteúdo, calculado uma única vez na criação.
+
+Este módulo não depende do QGIS.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+_RECORD_ARRAYS = ('starts', 'lengths', 'values')
+
+
+def changed_mask(before, after):
+    """Máscara dos píxeis diferentes entre dois arrays (NaN == NaN)."""
+    changed = before != after
+    if np.issubdtype(before.dtype, np.floating):
+        changed &= ~(np.isnan(before) & np.isnan(after))
+    return changed
+
+
+def encode_runs(mask):
+    """
+    Codifica uma máscara booleana (achatada em ordem C) em sequências
+    (início, comprimento) de píxeis consecutivos.
+    """
+    flat = np.ascontiguousarray(mask).ravel().view(np.int8)
+    edges = np.flatnonzero(np.diff(flat, prepend=0, append=0))
+    index_dtype = np.uint32 if flat.size < 2 ** 32 else np.uint64
+    starts = edges[0::2].astype(index_dtype)
+    lengths = (edges[1::2] - edges[0::2]).astype(index_dtype)
+    return starts, lengths
+
+
+def decode_runs(starts, lengths):
+    """Índices planos a partir das sequências (início, comprimento)."""
+    starts = starts.astype(np.intp)
+    lengths = lengths.astype(np.intp)
+    total = int(lengths.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+def record_digest(record):
+    """Resumo blake2b da geometria da janela e dos dados de um registo."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.array(
+        [record['x_min'], record['y_min'], record['n_cols'], record['n_rows'], int(record['data_type'])],
+        dtype=np.int64
+    ).tobytes())
+    if 'bands' in record:
+        digest.update(np.array(record['bands'], dtype=np.int64).tobytes())
+    for key in _RECORD_ARRAYS:
+        digest.update(record[key].dtype.str.encode('ascii'))
+        digest.update(np.ascontiguousarray(record[key]).data)
+    return digest.hexdigest()
+
+
+def make_record(x_min, y_min, before, after, data_type, changed=None, bands=None):
+    """
+    Cria o registo de UNDO para uma edição que transformou `before` em
+    `after` (janela com canto superior esquerdo em (x_min, y_min)). A máscara
+    `changed` dos píxeis alterados é calculada quando não é indicada.
+
+    Com `bands` (números das bandas), `before` e `after` são 3D (bandas,
+    linhas, colunas) e o registo cobre todas as bandas.
+
+    Devolve None quando nenhum píxel foi alterado.
+    """
+    if changed is None:
+        changed = changed_mask(before, after)
+    if changed.ndim == 3:
+        changed = changed.any(axis=0)
+    rows = np.flatnonzero(changed.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(changed.any(axis=0))
+
+    # Reduzir a janela ao retângulo que contém as alterações
+    r0, r1 = rows[0], rows[-1] + 1
+    c0, c1 = cols[0], cols[-1] + 1
+    changed = changed[r0:r1, c0:c1]
+    starts, lengths = encode_runs(changed)
+    record = {
+        'x_min': int(x_min + c0),
+        'y_min': int(y_min + r0),
+        'n_cols': int(c1 - c0),
+        'n_rows': int(r1 - r0),
+        'data_type': data_type,
+        'starts': starts,
+        'lengths': lengths,
+        'values': before[..., r0:r1, c0:c1][..., changed]
+    }
+    if bands is not None:
+        record['bands'] = [int(band) for band in bands]
+    record['digest'] = record_digest(record)
+    return record
+
+
+def record_values(array, x_min, y_min, record):
+    """
+    Valores de `array` (janela com canto superior esquerdo em (x_min, y_min),
+    2D ou 3D com as bandas primeiro) nos píxeis abrangidos pelo registo.
+    """
+    indices = decode_runs(record['starts'], record['lengths'])
+    rows = indices // record['n_cols'] + (record['y_min'] - y_min)
+    cols = indices % record['n_cols'] + (record['x_min'] - x_min)
+    return array[..., rows, cols]
+
+
+def swap_record(array, record):
+    """
+    Aplica o registo sobre `array` (a janela do registo, editável; 3D com as
+    bandas primeiro nos registos de várias bandas) e devolve o registo
+    inverso, com os valores que foram substituídos.
+    """
+    indices = decode_runs(record['starts'], record['lengths'])
+    flat = array.reshape(array.shape[:-2] + (-1,))
+    inverse = dict(record)
+    inverse['values'] = flat[..., indices].copy()
+    inverse['digest'] = record_digest(inverse)
+    flat[..., indices] = record['values']
+    return inverse
+
+
+def record_nbytes(record):
+    """Memória ocupada pelos dados de um registo, em bytes."""
+    return record['starts'].nbytes + record['lengths'].nbytes + record['values'].nbytes
+
+
+# Orçamentos por omissão do histórico (bytes)
+DEFAULT_RAM_BUDGET = 256 * 1024 ** 2
+DEFAULT_DISK_BUDGET = 4 * 1024 ** 3
+
+class HistoryStore:
+    """
+    Contabilidade de memória partilhada pelas pilhas de UNDO e REDO.
+
+    Quando os registos em memória excedem `ram_budget`, os mais antigos são
+    transferidos para ficheiros .npy num diretório temporário da sessão e
+    lidos de volta quando voltam a ser necessários.
+    Acima de `disk_budget` os registos mais antigos são descartados.
+    """
+
+    def __init__(self, ram_budget=DEFAULT_RAM_BUDGET, disk_budget=DEFAULT_DISK_BUDGET):
+        self.ram_budget = ram_budget
+        self.disk_budget = disk_budget
+        self.directory = None
+        self.stacks = []
+        self._counter = 0
+
+    def ram_bytes(self):
+        return sum(record_nbytes(r) for s in self.stacks for r in s.records if 'files' not in r)
+
+    def disk_bytes(self):
+        return sum(r['disk_bytes'] for s in self.stacks for r in s.records if 'files' in r)
+
+    def enforce(self):
+        """Aplica os orçamentos, dos registos mais antigos para os mais recentes."""
+        ram = self.ram_bytes()
+        if ram > self.ram_budget:
+            for record in self._spill_candidates():
+                ram -= record_nbytes(record)
+                self._spill(record)
+                if ram <= self.ram_budget:
+                    break
+
+        disk = self.disk_bytes()
+        while disk > self.disk_budget:
+            for stack in self.stacks:
+                if stack.records and 'files' in stack.records[0]:
+                    record = stack.records.pop(0)
+                    disk -= record['disk_bytes']
+                    self._discard(record)
+                    break
+            else:
+                break
+
+    def release(self):
+        """Remove o diretório temporário da sessão."""
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def _spill_candidates(self):
+        # A base de cada pilha contém os registos mais afastados do estado atual;
+        # o topo de cada pilha fica sempre em memória
+        for stack in self.stacks:
+            for record in stack.records[:-1]:
+                if 'files' not in record:
+                    yield record
+
+    def _spill(self, record):
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='rasteredit_history_')
+        self._counter += 1
+        files = {}
+        for key in _RECORD_ARRAYS:
+            path = os.path.join(self.directory, f"{self._counter:06d}_{key}.npy")
+            np.save(path, record.pop(key))
+            files[key] = path
+        record['files'] = files
+        record['disk_bytes'] = sum(os.path.getsize(p) for p in files.values())
+
+    def page_in(self, record):
+        """Lê de volta para memória um registo transferido para disco."""
+        files = record.pop('files', None)
+        if files is None:
+            return record
+        for key, path in files.items():
+            record[key] = np.load(path)
+        record.pop('disk_bytes', None)
+        self._discard({'files': files})
+        # Verificar a integridade do registo lido do disco
+        if record_digest(record) != record['digest']:
+            raise ValueError("Undo history record read back from disk is corrupted.")
+        return record
+
+    def _discard(self, record):
+        for path in record.get('files', {}).values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class HistoryStack:
+    """Pilha de registos de UNDO ou REDO sujeita aos orçamentos de um HistoryStore."""
+
+    def __init__(self, store):
+        self.store = store
+        self.records = []
+        store.stacks.append(self)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
+
+    def __getitem__(self, index):
+        # Acesso apenas aos metadados (p.ex. 'digest'), sem ler os dados do disco
+        return self.records[index]
+
+    def append(self, record):
+        self.records.append(record)
+        self.store.enforce()
+
+    def pop(self):
+        return self.store.page_in(self.records.pop())
+
+    def clear(self):
+        for record in self.records:
+            self.store._discard(record)
+        self.records.clear()
+
+
+def format_bytes(size):
+    """Tamanho legível (KB, MB, GB)."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
@@ -0,0 +1,700 @@
+"""
+Seleção de pontos de suporte e funções auxiliares de interpolação.
+
+O SciPy só é importado dentro das funções que o usam, na primeira
+interpolação, para não pesar no arranque do QGIS.
+
+Este módulo não depende do QGIS.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from .tracing import span
+
+
+# Métodos de interpolação disponíveis
+METHODS = ('linear', 'cubic', 'nearest', 'idw')
+
+# Largura mínima do anel de suporte usado para cada buraco isolado
+COMPONENT_RING_WIDTH = 5
+
+# Precisões de cálculo disponíveis para a interpolação
+PRECISIONS = ('auto', 'float32', 'float64')
+
+# Parâmetros por omissão da interpolação por mosaicos (píxeis)
+DEFAULT_TILE_SIZE = 512
+DEFAULT_TILE_HALO = 32
+
+# Parâmetros por omissão do IDW (raio em píxeis; 0 = sem limite)
+DEFAULT_IDW_POWER = 2.0
+DEFAULT_IDW_NEIGHBORS = 12
+DEFAULT_IDW_RADIUS = 0.0
+
+# Pontos avaliados por lote no IDW e no vizinho mais próximo (limita a
+# memória das consultas k-NN, que o SciPy faz em float64)
+IDW_BATCH_SIZE = 65536
+
+
+def compute_dtype(native_dtype, precision='auto'):
+    """
+    Tipo de vírgula flutuante usado nos cálculos de interpolação.
+
+    Em modo 'auto' usa float32, exceto para rasters Float64 e para inteiros de
+    32 bits, cujos valores não cabem exatamente na mantissa de um float32.
+
+    Este tipo é usado no bloco de trabalho, nas listas de pontos de suporte e
+    de destino e nos cálculos do IDW e do vizinho mais próximo. A triangulação
+    (Qhull), a árvore KD e os interpoladores 'linear' e 'cubic' do SciPy
+    calculam sempre internamente em float64.
+    """
+    if precision != 'auto':
+        return np.dtype(precision)
+    native_dtype = np.dtype(native_dtype)
+    if native_dtype == np.float64 or (np.issubdtype(native_dtype, np.integer)
+                                      and native_dtype.itemsize >= 4):
+        return np.dtype(np.float64)
+    return np.dtype(np.float32)
+
+
+class TriangulationCache:
+    """
+    Cache LRU de triangulações de Delaunay e árvores KD, indexado pelo resumo
+    do conjunto de pontos de suporte.
+
+    Permite comparar métodos ('linear', 'cubic', 'nearest', 'idw') ou repetir
+    uma interpolação sobre a mesma área pagando apenas a fase de avaliação.
+
+    Com `uses` cada entrada é largada depois de ser devolvida `uses` vezes
+    (contando com a que a construiu), p.ex. quando todas as bandas de uma
+    edição já usaram a triangulação de um buraco ou mosaico. Pedidos
+    simultâneos da mesma entrada esperam pela thread que a está a construir
+    em vez de a construírem também.
+    """
+
+    def __init__(self, maxsize=3, uses=None):
+        self.maxsize = maxsize
+        self.uses = uses
+        self._entries = OrderedDict()
+        self._remaining = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def delaunay(self, points):
+        from scipy.spatial import Delaunay
+        return self._get(points, 'delaunay', Delaunay)
+
+    def kdtree(self, points):
+        return self._get(points, 'kdtree', build_kdtree)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._remaining.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, points, kind, build):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(points.shape).encode('ascii'))
+        digest.update(points.dtype.str.encode('ascii'))
+        digest.update(np.ascontiguousarray(points).data)
+        key = (digest.digest(), kind)
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    return self._use(key)
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = threading.Event()
+                    break
+            # Outra thread está a construir esta entrada
+            pending.wait()
+
+        # Construir fora do lock (a triangulação pode demorar)
+        try:
+            value = build(points)
+        except BaseException:
+            with self._lock:
+                del self._pending[key]
+                pending.set()
+            raise
+        with self._lock:
+            del self._pending[key]
+            pending.set()
+            if self.uses is None or self.uses > 1:
+                self._entries[key] = value
+                if self.uses is not None:
+                    self._remaining[key] = self.uses - 1
+                while len(self._entries) > self.maxsize:
+                    self._remaining.pop(self._entries.popitem(last=False)[0], None)
+        return value
+
+    def _use(self, key):
+        """Devolve uma entrada presente, largando-a quando esgota os usos."""
+        value = self._entries[key]
+        self._entries.move_to_end(key)
+        if key in self._remaining:
+            self._remaining[key] -= 1
+            if self._remaining[key] == 0:
+                del self._entries[key]
+                del self._remaining[key]
+        return value
+
+
+def build_kdtree(points):
+    """
+    Árvore KD dos pontos de suporte. Os pontos estão numa grelha regular, com
+    muitas distâncias iguais; sem compactar os nós nem equilibrar a árvore
+    pela mediana as consultas k-NN longe do suporte (interior de buracos
+    grandes) são duas a três vezes mais rápidas.
+    """
+    from scipy.spatial import cKDTree
+    return cKDTree(points, compact_nodes=False, balanced_tree=False)
+
+
+# Cache partilhada pelas interpolações da sessão
+triangulation_cache = TriangulationCache()
+
+
+def idw_interpolator(tree, values, fill_value, power=DEFAULT_IDW_POWER,
+                     neighbors=DEFAULT_IDW_NEIGHBORS, radius=DEFAULT_IDW_RADIUS,
+                     batch_size=IDW_BATCH_SIZE):
+    """
+    Interpolador por inverso da distância (IDW) sobre a árvore KD `tree` dos
+    pontos de suporte: cada ponto recebe a média dos `neighbors` pontos de
+    suporte mais próximos, pesados por 1 / distância ** `power`.
+
+    Com `radius` > 0 só contam os vizinhos a essa distância (em píxeis); os
+    pontos sem nenhum recebem `fill_value`. Os pontos que coincidem com um
+    ponto de suporte recebem o seu valor. A avaliação é feita em lotes de
+    `batch_size` pontos, com as consultas k-NN em paralelo em todos os
+    núcleos. Os pesos e o resultado são calculados no tipo de `values`.
+    """
+    values = np.asarray(values)
+    dtype = values.dtype if values.dtype.kind == 'f' else np.dtype(np.float64)
+    k = max(min(int(neighbors), tree.n), 1)
+    upper_bound = radius if radius > 0 else np.inf
+    # Posição extra para os vizinhos em falta (índice tree.n, peso nulo)
+    padded = np.append(values.astype(dtype, copy=False), dtype.type(0))
+
+    def evaluate(xi):
+        result = np.empty(len(xi), dtype=dtype)
+        for start in range(0, len(xi), batch_size):
+            distances, indices = tree.query(xi[start:start + batch_size], k=k,
+                                            distance_upper_bound=upper_bound, workers=-1)
+            if k == 1:
+                distances, indices = distances[:, None], indices[:, None]
+            distances = distances.astype(dtype, copy=False)
+            with np.errstate(divide='ignore', over='ignore'):
+                weights = distances ** -power
+            weights[np.isinf(distances)] = 0
+            exact = distances[:, 0] == 0
+            weights[exact] = 0
+            weights[exact, 0] = 1
+            total = weights.sum(axis=1)
+            with np.errstate(invalid='ignore'):
+                batch = np.einsum('ij,ij->i', weights, padded[indices]) / total
+            batch[total == 0] = fill_value
+            result[start:start + batch_size] = batch
+        return result
+
+    return evaluate
+
+
+def nearest_interpolator(tree, values, batch_size=IDW_BATCH_SIZE):
+    """Vizinho mais próximo sobre a árvore KD `tree`, avaliado em lotes."""
+    def evaluate(xi):
+        result = np.empty(len(xi), dtype=values.dtype)
+        for start in range(0, len(xi), batch_size):
+            result[start:start + batch_size] = values[tree.query(xi[start:start + batch_size], workers=-1)[1]]
+        return result
+
+    return evaluate
+
+
+def make_interpolator(points, values, method, fill_value, cache=None, idw=None):
+    """
+    Interpolador reutilizável sobre os pontos de suporte, equivalente a
+    scipy.interpolate.griddata. A triangulação (ou a árvore KD, para
+    'nearest' e 'idw') é obtida de `cache`, se indicada. `idw` são as opções
+    de idw_interpolator (power, neighbors, radius).
+
+    Os pontos mantêm o tipo de cálculo (ver compute_dtype); as conversões
+    para float64 ficam a cargo do SciPy.
+    """
+    from scipy.interpolate import CloughTocher2DInterpolator, LinearNDInterpolator
+    from scipy.spatial import Delaunay
+
+    points = np.asarray(points)
+    if method in ('nearest', 'idw'):
+        tree = cache.kdtree(points) if cache is not None else build_kdtree(points)
+        if method == 'idw':
+            return idw_interpolator(tree, values, fill_value, **(idw or {}))
+        return nearest_interpolator(tree, values)
+    tri = cache.delaunay(points) if cache is not None else Delaunay(points)
+    if method == 'linear':
+        return LinearNDInterpolator(tri, values, fill_value=fill_value)
+    if method == 'cubic':
+        return CloughTocher2DInterpolator(tri, values, fill_value=fill_value)
+    raise ValueError(f"Unknown interpolation method: {method}")
+
+
+def interpolate_points(points, values, xi, method, fill_value, cache=None, idw=None):
+    """Interpola `values` nos pontos `xi` (ver make_interpolator)."""
+    with span('build_interpolator', method=method, source_points=len(points)):
+        interpolator = make_interpolator(points, values, method, fill_value, cache, idw)
+    with span('evaluate', method=method, target_points=len(xi)):
+        return interpolator(np.asarray(xi))
+
+
+def support_ring(target_mask, valid_mask, width):
+    """
+    Restringe os pontos de suporte (`valid_mask`) aos píxeis válidos que
+    distam no máximo `width` píxeis da zona a interpolar (`target_mask`).
+
+    Com `width` <= 0 devolve `valid_mask` inalterada (todos os píxeis válidos).
+    A transformada de distância é calculada apenas na janela que envolve a
+    zona alvo alargada de `width` píxeis, e não no bloco inteiro.
+    """
+    if width <= 0:
+        return valid_mask
+    from scipy.ndimage import distance_transform_edt
+
+    ring = np.zeros_like(valid_mask)
+    rows = np.flatnonzero(target_mask.any(axis=1))
+    if len(rows) == 0:
+        return ring
+    cols = np.flatnonzero(target_mask.any(axis=0))
+    margin = int(np.ceil(width))
+    r0 = max(rows[0] - margin, 0)
+    r1 = min(rows[-1] + margin + 1, target_mask.shape[0])
+    c0 = max(cols[0] - margin, 0)
+    c1 = min(cols[-1] + margin + 1, target_mask.shape[1])
+
+    # Distância euclidiana de cada píxel ao píxel alvo mais próximo
+    distance = distance_transform_edt(~target_mask[r0:r1, c0:c1])
+    ring[r0:r1, c0:c1] = valid_mask[r0:r1, c0:c1] & (distance <= width)
+    return ring
+
+
+def interpolate_mask(array, target_mask, source_mask, method, fill_value,
+                     pixel_size=(1.0, 1.0), cache=triangulation_cache, idw=None):
+    """
+    Interpola em `array` (no próprio lugar) os píxeis de `target_mask` a partir
+    dos píxeis de `source_mask`, em espaço de índices de píxel.
+
+    Só são reunidas as coordenadas dos píxeis de origem e de destino, no
+    mesmo tipo que `array`; não são criadas grelhas de coordenadas do bloco.
+    A triangulação é reutilizada através de `cache`.
+    """
+    target_idx = np.nonzero(target_mask)
+    if len(target_idx[0]) == 0:
+        return
+    source_idx = np.nonzero(source_mask)
+    if len(source_idx[0]) == 0:
+        raise ValueError("No valid pixels around the selected area to interpolate from.")
+    array[target_idx] = interpolate_points(
+        pixel_points(source_idx, pixel_size, array.dtype),
+        array[source_idx],
+        pixel_points(target_idx, pixel_size, array.dtype),
+        method,
+        fill_value,
+        cache,
+        idw
+    )
+
+
+def fill_components(array, interp_mask, valid_mask, ring_width, method,
+                    fill_value, pixel_size=(1.0, 1.0), workers=1, progress=None, idw=None,
+                    cache=None):
+    """
+    Interpola cada componente conexa de `interp_mask` (cada buraco) de forma
+    independente, a partir do seu próprio anel de suporte local.
+
+    Os valores são escritos em `array` no próprio lugar. As coordenadas são
+    índices de píxel (ver pixel_points), no mesmo tipo que `array`. Com `workers` > 1 os buracos são
+    resolvidos em paralelo num conjunto de threads. `progress`, se indicado, é
+    chamado com (buracos concluídos, total de buracos). As triangulações de
+    cada buraco são obtidas de `cache`, se indicada.
+
+    Devolve o número de buracos processados.
+    """
+    from scipy.ndimage import find_objects, label
+
+    ring_width = max(int(ring_width), COMPONENT_RING_WIDTH)
+    labels, count = label(interp_mask)
+    windows = find_objects(labels)
+    rows, cols = array.shape
+
+    def solve(index):
+        window = windows[index]
+        r0 = max(window[0].start - ring_width, 0)
+        r1 = min(window[0].stop + ring_width, rows)
+        c0 = max(window[1].start - ring_width, 0)
+        c1 = min(window[1].stop + ring_width, cols)
+        target = labels[r0:r1, c0:c1] == index + 1
+        sources = support_ring(target, valid_mask[r0:r1, c0:c1], ring_width)
+
+        target_idx = np.nonzero(target)
+        source_idx = np.nonzero(sources)
+        if len(source_idx[0]) == 0:
+            return index, target_idx, r0, c0, None
+        values = interpolate_points(
+            pixel_points(source_idx, pixel_size, array.dtype),
+            array[r0:r1, c0:c1][sources],
+            pixel_points(target_idx, pixel_size, array.dtype),
+            # Poucos pontos não chegam para triangular
+            method if len(source_idx[0]) > 3 else 'nearest',
+            fill_value,
+            cache,
+            idw
+        )
+        return index, target_idx, r0, c0, values
+
+    def apply(result, done):
+        index, target_idx, r0, c0, values = result
+        rows_idx = target_idx[0] + r0
+        cols_idx = target_idx[1] + c0
+        array[rows_idx, cols_idx] = fill_value if values is None else values
+        if progress is not None:
+            progress(done, count)
+
+    if workers > 1 and count > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(solve, i) for i in range(count)]
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    apply(future.result(), done)
+            except BaseException:
+                # Não resolver os buracos restantes (p.ex. cancelamento)
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for i in range(count):
+            apply(solve(i), i + 1)
+    return count
+
+
+def tile_weights(start, stop, lo, hi, blend, dtype=np.float64):
+    """
+    Pesos 1D de um mosaico avaliado em [start, stop), limitado ao bloco
+    [lo, hi): rampa linear nas bandas de sobreposição com os mosaicos
+    vizinhos e 1 junto às margens do bloco, onde não há vizinho. Os pesos
+    são criados no tipo de cálculo `dtype`.
+    """
+    index = np.arange(start, stop)
+    weights = np.ones(stop - start, dtype=dtype)
+    if blend > 0:
+        ramp_width = 2 * blend + 1
+        if start > lo:
+            np.minimum(weights, (index - start + 1) / ramp_width, out=weights)
+        if stop < hi:
+            np.minimum(weights, (stop - index) / ramp_width, out=weights)
+    return weights
+
+
+def coarse_sources(array, source_mask, cell, pixel_size=(1.0, 1.0)):
+    """
+    Pontos de suporte reduzidos a uma grelha de células de `cell` píxeis: um
+    ponto por célula com pontos de `source_mask`, na posição e com o valor
+    médios dos seus píxeis. As células são reduzidas por faixas de `cell`
+    linhas, sem criar arrays do tamanho do bloco.
+
+    Devolve (pontos, valores), com os pontos no espaço de pixel_points.
+    """
+    rows, cols = array.shape
+    n_cells = -(-cols // cell)
+    pad = n_cells * cell - cols
+    col_index = np.arange(cols, dtype=np.float64)
+    aspect = pixel_size[1] / pixel_size[0]
+    point_rows, point_cols, values = [], [], []
+    for r in range(0, rows, cell):
+        mask = source_mask[r:r + cell]
+        if not mask.any():
+            continue
+        height = mask.shape[0]
+
+        def cell_sums(strip):
+            strip = np.pad(strip, ((0, 0), (0, pad))) if pad else strip
+            return strip.reshape(height, n_cells, cell).sum(axis=(0, 2), dtype=np.float64)
+
+        count = cell_sums(mask)
+        keep = count > 0
+        count = count[keep]
+        row_index = np.arange(r, r + height, dtype=np.float64)[:, None]
+        point_rows.append(cell_sums(mask * row_index)[keep] / count)
+        point_cols.append(cell_sums(mask * col_index)[keep] / count)
+        values.append(cell_sums(np.where(mask, array[r:r + cell], 0))[keep] / count)
+
+    points = np.empty((sum(len(v) for v in values), 2), dtype=array.dtype)
+    points[:, 0] = np.concatenate(point_cols)
+    points[:, 1] = np.concatenate(point_rows) * aspect
+    return points, np.concatenate(values).astype(array.dtype)
+
+
+def interpolate_tiled(array, target_mask, source_mask, method, fill_value,
+                      pixel_size=(1.0, 1.0), tile_size=DEFAULT_TILE_SIZE,
+                      halo=DEFAULT_TILE_HALO, workers=1, progress=None, idw=None, cache=None):
+    """
+    Interpola em `array` (no próprio lugar) os píxeis de `target_mask` por
+    mosaicos de `tile_size` píxeis, cada um a partir dos píxeis de
+    `source_mask` a no máximo `halo` píxeis dos seus píxeis a interpolar.
+
+    Cada mosaico é avaliado no seu núcleo alargado de metade do halo; nas
+    bandas onde mosaicos vizinhos se sobrepõem os resultados são misturados
+    com pesos lineares que somam 1, acumulados diretamente em `array`, para
+    que não fiquem costuras visíveis. Só são criados arrays do tamanho de um
+    mosaico, e os mosaicos podem ser resolvidos em paralelo (`workers` > 1).
+
+    Os píxeis afastados do suporte local (interior de buracos maiores que o
+    halo) são avaliados num interpolador grosseiro sobre os pontos de
+    `source_mask` reduzidos a células de metade do halo (ver
+    coarse_sources), construído uma única vez e apenas se for necessário.
+    Entre as duas distâncias os valores local e grosseiro são misturados
+    linearmente. As triangulações de cada mosaico e a do interpolador
+    grosseiro são obtidas de `cache`, se indicada.
+
+    `progress`, se indicado, é chamado com (mosaicos concluídos, total de
+    mosaicos). Devolve o número de mosaicos processados.
+    """
+    from scipy.ndimage import distance_transform_edt
+
+    tile_size = max(int(tile_size), 1)
+    halo = max(int(halo), 2)
+    blend = halo // 2
+    # Distâncias ao suporte local: até `near` só o valor local, a partir de
+    # `reach` só o valor grosseiro
+    reach = halo - blend
+    near = reach / 2
+    rows, cols = array.shape
+
+    # Mosaicos com píxeis a interpolar na janela avaliada (núcleo + banda de
+    # mistura), para que os pesos de cada píxel somem 1
+    tiles = [
+        (r, c)
+        for r in range(0, rows, tile_size)
+        for c in range(0, cols, tile_size)
+        if target_mask[max(r - blend, 0):r + tile_size + blend, max(c - blend, 0):c + tile_size + blend].any()
+    ]
+    count = len(tiles)
+    if count == 0:
+        return 0
+    if not source_mask.any():
+        raise ValueError("No valid pixels around the selected area to interpolate from.")
+
+    coarse_lock = threading.Lock()
+    coarse_interpolator = []
+
+    def coarse_values(rows_idx, cols_idx):
+        with coarse_lock:
+            if not coarse_interpolator:
+                with span('coarse_interpolator', cell=reach) as s:
+                    points, values = coarse_sources(array, source_mask, reach, pixel_size)
+                    s.set(source_points=len(points))
+                    coarse_interpolator.append(make_interpolator(
+                        points, values, method if len(points) > 3 else 'nearest', np.nan,
+                        cache, idw
+                    ))
+        return coarse_interpolator[0](pixel_points((rows_idx, cols_idx), pixel_size, array.dtype))
+
+    def solve(tile):
+        r, c = tile
+        # Janela avaliada (núcleo + banda de mistura) e janela de suporte (núcleo + halo)
+        er0, er1 = max(r - blend, 0), min(r + tile_size + blend, rows)
+        ec0, ec1 = max(c - blend, 0), min(c + tile_size + blend, cols)
+        sr0, sr1 = max(r - halo, 0), min(r + tile_size + halo, rows)
+        sc0, sc1 = max(c - halo, 0), min(c + tile_size + halo, cols)
+
+        target_idx = np.nonzero(target_mask[er0:er1, ec0:ec1])
+        rows_idx = target_idx[0] + er0
+        cols_idx = target_idx[1] + ec0
+        sources = source_mask[sr0:sr1, sc0:sc1]
+
+        # Peso do valor local de cada píxel, pela distância ao suporte local
+        if sources.any():
+            distance = distance_transform_edt(~sources)[rows_idx - sr0, cols_idx - sc0]
+            local_weight = np.clip((reach - distance) / (reach - near), 0, 1).astype(array.dtype)
+        else:
+            local_weight = np.zeros(len(rows_idx), dtype=array.dtype)
+        values = np.zeros(len(rows_idx), dtype=array.dtype)
+
+        local = local_weight > 0
+        if local.any():
+            local_sources = sources
+            if np.count_nonzero(sources) > np.count_nonzero(local):
+                # Suporte denso (sem anel): só os pontos a menos de `halo`
+                # píxeis dos píxeis avaliados localmente são triangulados
+                local_target = np.zeros_like(sources)
+                local_target[rows_idx[local] - sr0, cols_idx[local] - sc0] = True
+                local_sources = support_ring(local_target, sources, halo)
+            source_idx = np.nonzero(local_sources)
+            local_values = interpolate_points(
+                pixel_points(source_idx, pixel_size, array.dtype),
+                array[sr0:sr1, sc0:sc1][local_sources],
+                pixel_points((rows_idx[local] - sr0, cols_idx[local] - sc0), pixel_size, array.dtype),
+                # Poucos pontos não chegam para triangular
+                method if len(source_idx[0]) > 3 else 'nearest',
+                np.nan,
+                cache,
+                idw
+            )
+            # Pontos fora da envolvente convexa do suporte local
+            outside = np.isnan(local_values)
+            local_weight[np.flatnonzero(local)[outside]] = 0
+            values[local] = np.nan_to_num(local_values) * local_weight[local]
+
+        coarse = local_weight < 1
+        if coarse.any():
+            values[coarse] += coarse_values(rows_idx[coarse], cols_idx[coarse]) * (1 - local_weight[coarse])
+
+        w = (tile_weights(er0, er1, 0, rows, blend, array.dtype)[rows_idx - er0]
+             * tile_weights(ec0, ec1, 0, cols, blend, array.dtype)[cols_idx - ec0])
+        return rows_idx, cols_idx, values * w
+
+    # Píxeis sem valor (fora da envolvente convexa de todo o suporte)
+    missing = []
+
+    def apply(result, done):
+        rows_idx, cols_idx, values = result
+        array[rows_idx, cols_idx] += values
+        nan = np.isnan(values)
+        if nan.any():
+            missing.append((rows_idx[nan], cols_idx[nan]))
+        if progress is not None:
+            progress(done, count)
+
+    # Os valores dos mosaicos são somados aos píxeis a interpolar
+    array[target_mask] = 0
+    if workers > 1 and count > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(solve, tile) for tile in tiles]
+            try:
+                # Somados pela ordem dos mosaicos, e não pela de conclusão,
+                # para que o resultado não dependa do escalonamento
+                for done, future in enumerate(futures, 1):
+                    apply(future.result(), done)
+            except BaseException:
+                # Não resolver os mosaicos restantes (p.ex. cancelamento)
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for done, tile in enumerate(tiles, 1):
+            apply(solve(tile), done)
+
+    for rows_idx, cols_idx in missing:
+        array[rows_idx, cols_idx] = fill_value
+    return count
+
+
+def interpolate_polygon(array, mask, no_data_value, method, all_values=False,
+                        ring_width=0, components=False, tiled=False,
+                        tile_size=DEFAULT_TILE_SIZE, halo=DEFAULT_TILE_HALO,
+                        pixel_size=(1.0, 1.0), precision='auto', workers=1, checkpoint=None,
+                        idw_power=DEFAULT_IDW_POWER, idw_neighbors=DEFAULT_IDW_NEIGHBORS,
+                        idw_radius=DEFAULT_IDW_RADIUS, cache=None):
+    """
+    Interpolação de um polígono (`mask`) num bloco `array` no tipo nativo do
+    raster, como nas ferramentas Interpolate Zone e Interpolate All.
+
+    Sem `all_values` são interpolados apenas os píxeis NoData do polígono; os
+    buracos são resolvidos um a um com `components`. Com `all_values` todos os
+    píxeis do polígono são interpolados a partir dos píxeis de fora. Com
+    `ring_width` > 0 o suporte restringe-se a um anel com essa largura e com
+    `tiled` a interpolação é feita por mosaicos (ver interpolate_tiled). As
+    opções `idw_*` aplicam-se ao método 'idw' (ver idw_interpolator).
+
+    A interpolação da área inteira reutiliza as triangulações da sessão
+    (triangulation_cache); as dos buracos (`components`) e dos mosaicos
+    (`tiled`) só são reutilizadas através de `cache`, se indicada.
+
+    Os cálculos são feitos na precisão `precision` (ver compute_dtype).
+    `checkpoint(progress)`, se indicado, é chamado com o progresso de 20 a
+    90. Devolve um novo array no tipo nativo.
+    """
+    checkpoint = checkpoint or (lambda progress: None)
+    idw = {'power': idw_power, 'neighbors': idw_neighbors, 'radius': idw_radius}
+    original_dtype = array.dtype
+    nodata_mask = array == no_data_value  # comparação no tipo nativo
+    with span('cast', bytes=array.nbytes):
+        work = array.astype(compute_dtype(original_dtype, precision))
+    checkpoint(20)
+
+    if all_values:
+        target_mask = mask
+        if ring_width > 0:
+            # Apenas píxeis válidos (sem NoData) junto à fronteira do polígono
+            valid_mask = support_ring(mask, ~mask & ~nodata_mask, ring_width)
+        else:
+            valid_mask = ~mask
+    else:
+        target_mask = mask & nodata_mask
+        if components:
+            # Cada buraco é interpolado a partir do seu próprio anel de suporte
+            with span('fill_components') as s:
+                count = fill_components(
+                    work, target_mask, ~nodata_mask, ring_width,
+                    method, no_data_value,
+                    pixel_size=pixel_size,
+                    workers=workers,
+                    progress=lambda done, total: checkpoint(20 + 70 * done / total),
+                    idw=idw,
+                    cache=cache
+                )
+                s.set(holes=count)
+            checkpoint(90)
+            with span('cast', bytes=work.nbytes):
+                return work.astype(original_dtype)
+        if ring_width > 0:
+            # Apenas píxeis válidos junto aos buracos
+            valid_mask = support_ring(target_mask, ~nodata_mask, ring_width)
+        else:
+            valid_mask = ~nodata_mask & ~mask
+
+    # Interpolar apenas os pontos necessários (em espaço de índices de píxel)
+    if np.any(target_mask):
+        checkpoint(30)
+        if tiled:
+            # Mosaicos com halo, em paralelo
+            with span('interpolate_tiled', tile_size=tile_size, halo=halo) as s:
+                tiles = interpolate_tiled(
+                    work, target_mask, valid_mask, method, no_data_value,
+                    pixel_size=pixel_size,
+                    tile_size=tile_size, halo=halo,
+                    workers=workers,
+                    progress=lambda done, total: checkpoint(30 + 60 * done / total),
+                    idw=idw,
+                    cache=cache
+                )
+                s.set(tiles=tiles)
+        else:
+            interpolate_mask(work, target_mask, valid_mask, method, no_data_value,
+                             pixel_size=pixel_size, idw=idw)
+    checkpoint(90)
+    with span('cast', bytes=work.nbytes):
+        return work.astype(original_dtype)
+
+
+def pixel_points(index, pixel_size=(1.0, 1.0), dtype=np.float64):
+    """
+    Pares (x, y) em espaço de índices de píxel a partir de índices
+    (linhas, colunas), como devolvidos por np.nonzero.
+
+    As colunas são usadas diretamente; as linhas são escaladas pela razão
+    res_y / res_x, de modo que as distâncias mantêm as proporções físicas
+    quando os píxeis não são quadrados.
+    """
+    points = np.empty((len(index[0]), 2), dtype=dtype)
+    points[:, 0] = index[1]
+    aspect = pixel_size[1] / pixel_size[0]
+    if aspect == 1:
+        points[:, 1] = index[0]
+    else:
+        np.multiply(index[0], aspect, out=points[:, 1], casting='unsafe')
+    return points
@@ -0,0 +1,230 @@
+"""
+Diário (journal) persistente das edições, em modo apenas-acrescentar.
+
+O diário é um ficheiro binário ao lado do raster `_edited` que regista, para
+cada edição, a janela afetada e os valores anteriores e posteriores dos
+píxeis alterados, comprimidos com zlib. As operações de UNDO e REDO são
+registadas como marcadores. Assim o histórico sobrevive ao fecho do QGIS e
+uma sessão interrompida pode ser revertida ou reposta.
+
+A escrita é feita por uma thread dedicada: a edição apenas coloca a entrada
+numa fila. As entradas são escritas sequencialmente e o fsync é feito em
+lotes (a cada `sync_every` entradas ou `sync_interval` segundos).
+
+Formato: cabeçalho JOURNAL_MAGIC seguido de entradas
+<ENTRY_MAGIC, tamanho comprimido, crc32> + dados zlib. Os dados descomprimidos
+são <tamanho dos metadados> + metadados JSON + arrays em bruto pela ordem de
+`_PAYLOAD_ARRAYS`. Uma entrada final incompleta ou corrompida (p.ex. após uma
+falha) é ignorada na leitura.
+
+Este módulo não depende do QGIS.
+"""
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from .history import record_digest
+
+JOURNAL_SUFFIX = '.rejournal'
+JOURNAL_MAGIC = b'RSTEDJ01'
+ENTRY_MAGIC = b'RJE1'
+
+_ENTRY_HEADER = struct.Struct('<4sII')
+_META_LENGTH = struct.Struct('<I')
+_PAYLOAD_ARRAYS = ('starts', 'lengths', 'before', 'after')
+
+EDIT = 'edit'
+UNDO = 'undo'
+REDO = 'redo'
+
+
+def journal_path(raster_path):
+    """Caminho do diário associado a um raster."""
+    return raster_path + JOURNAL_SUFFIX
+
+
+def encode_entry(meta, arrays=None, level=1):
+    """Serializa e comprime uma entrada do diário."""
+    arrays = arrays or {}
+    meta = dict(meta)
+    meta['arrays'] = [
+        [key, arrays[key].dtype.str, [int(n) for n in arrays[key].shape]]
+        for key in _PAYLOAD_ARRAYS if key in arrays
+    ]
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+    parts = [_META_LENGTH.pack(len(meta_bytes)), meta_bytes]
+    parts.extend(np.ascontiguousarray(arrays[key]).tobytes() for key, _, _ in meta['arrays'])
+    data = zlib.compress(b''.join(parts), level)
+    return _ENTRY_HEADER.pack(ENTRY_MAGIC, len(data), zlib.crc32(data)) + data
+
+
+def decode_entry(data):
+    """Descomprime uma entrada e devolve os metadados com os arrays."""
+    raw = zlib.decompress(data)
+    (meta_length,) = _META_LENGTH.unpack_from(raw)
+    offset = _META_LENGTH.size
+    entry = json.loads(raw[offset:offset + meta_length].decode('utf-8'))
+    offset += meta_length
+    for key, dtype, shape in entry.pop('arrays'):
+        shape = tuple(shape)
+        array = np.frombuffer(raw, dtype=np.dtype(dtype), count=int(np.prod(shape)), offset=offset)
+        entry[key] = array.reshape(shape).copy()
+        offset += array.nbytes
+    return entry
+
+
+def _scan(path):
+    """
+    Percorre as entradas válidas do diário, parando na primeira entrada
+    incompleta ou corrompida. Gera (dados comprimidos, fim da entrada).
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+            raise ValueError(f"Not a raster edit journal: {path}")
+        while True:
+            header = f.read(_ENTRY_HEADER.size)
+            if len(header) < _ENTRY_HEADER.size:
+                break
+            magic, length, crc = _ENTRY_HEADER.unpack(header)
+            data = f.read(length)
+            if magic != ENTRY_MAGIC or len(data) < length or zlib.crc32(data) != crc:
+                break
+            yield data, f.tell()
+
+
+def read_journal(path):
+    """Lê todas as entradas válidas do diário."""
+    if not os.path.exists(path):
+        return []
+    return [decode_entry(data) for data, _ in _scan(path)]
+
+
+def replay(entries):
+    """
+    Reconstrói o histórico a partir das entradas do diário.
+
+    Devolve (aplicadas, desfeitas): as edições atualmente aplicadas ao
+    raster, da mais antiga para a mais recente, e as edições desfeitas que
+    ainda podem ser refeitas, da próxima a refazer para a mais afastada.
+    """
+    applied, undone = [], []
+    for entry in entries:
+        kind = entry['kind']
+        if kind == EDIT:
+            applied.append(entry)
+            undone.clear()
+        elif kind == UNDO and applied:
+            undone.insert(0, applied.pop())
+        elif kind == REDO and undone:
+            applied.append(undone.pop(0))
+    return applied, undone
+
+
+def entry_record(entry, values):
+    """
+    Registo de histórico (ver history.make_record) a partir de uma entrada de
+    edição, com os valores `'before'` (para UNDO) ou `'after'` (para REDO).
+    """
+    record = {key: entry[key] for key in ('x_min', 'y_min', 'n_cols', 'n_rows', 'data_type')}
+    record['bands'] = entry['bands']
+    record['starts'] = entry['starts']
+    record['lengths'] = entry['lengths']
+    record['values'] = entry[values]
+    record['digest'] = record_digest(record)
+    # O resumo guardado no diário corresponde ao registo de UNDO
+    if values == 'before' and entry.get('digest') not in (None, record['digest']):
+        raise ValueError("Edit journal entry failed its integrity check.")
+    return record
+
+
+class EditJournal:
+    """Escritor do diário com thread dedicada e fsync em lotes."""
+
+    def __init__(self, path, sync_every=16, sync_interval=2.0, level=1):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.level = level
+        self.error = None
+        self._queue = queue.Queue()
+
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            # Descartar uma entrada final incompleta deixada por uma falha
+            valid_length = len(JOURNAL_MAGIC)
+            for _, valid_length in _scan(path):
+                pass
+            if valid_length < os.path.getsize(path):
+                os.truncate(path, valid_length)
+        self._file = open(path, 'ab', buffering=1024 * 1024)
+        if new_file:
+            self._file.write(JOURNAL_MAGIC)
+        self._thread = threading.Thread(target=self._writer, name='RasterEditJournal', daemon=True)
+        self._thread.start()
+
+    def record_edit(self, x_min, y_min, n_cols, n_rows, data_type, starts, lengths, before, after,
+                    digest, bands):
+        """
+        Regista uma edição (valores anteriores e posteriores dos píxeis
+        alterados). `digest` é o resumo do registo de UNDO correspondente.
+        Os valores têm uma linha por banda de `bands`.
+        """
+        meta = {
+            'kind': EDIT, 'time': time.time(),
+            'x_min': int(x_min), 'y_min': int(y_min),
+            'n_cols': int(n_cols), 'n_rows': int(n_rows),
+            'data_type': int(data_type), 'digest': digest, 'bands': bands
+        }
+        arrays = {'starts': starts, 'lengths': lengths, 'before': before, 'after': after}
+        self._queue.put((meta, arrays))
+
+    def record_undo(self):
+        self._queue.put(({'kind': UNDO, 'time': time.time()}, None))
+
+    def record_redo(self):
+        self._queue.put(({'kind': REDO, 'time': time.time()}, None))
+
+    def close(self):
+        """Escreve as entradas pendentes, sincroniza e fecha o ficheiro."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _writer(self):
+        pending = 0
+        last_sync = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.sync_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                try:
+                    self._file.write(encode_entry(item[0], item[1], self.level))
+                    pending += 1
+                except Exception as e:  # guardar o erro para a thread principal
+                    self.error = e
+            if pending and (pending >= self.sync_every
+                            or time.monotonic() - last_sync >= self.sync_interval):
+                self._sync()
+                pending = 0
+                last_sync = time.monotonic()
+        self._sync()
+        self._file.close()
+
+    def _sync(self):
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            self.error = e
@@ -0,0 +1,107 @@
+"""
+Logger dedicado do plugin.
+
+Todas as mensagens vão para o logger 'RasterEditPlugin', sem tocar no logger
+raiz nem nos handlers de outros plugins. Por omissão só passam avisos e
+erros; o nível e um ficheiro de registo opcional podem ser alterados em
+tempo de execução ou pelas variáveis de ambiente RASTEREDIT_LOG_LEVEL e
+RASTEREDIT_LOG_FILE.
+
+As mensagens usam formatação '%' preguiçosa (logger.debug("... %s", valor)),
+pelo que com o nível desligado não são formatadas. Em caminhos críticos,
+log_limited limita a frequência das mensagens repetidas.
+
+Este módulo não depende do QGIS.
+"""
+import logging
+import os
+import threading
+import time
+
+LOGGER_NAME = 'RasterEditPlugin'
+
+# Níveis disponíveis, pelo nome mostrado na interface
+LOG_LEVELS = {
+    'Off': logging.CRITICAL + 10,
+    'Error': logging.ERROR,
+    'Warning': logging.WARNING,
+    'Info': logging.INFO,
+    'Debug': logging.DEBUG,
+}
+DEFAULT_LOG_LEVEL = 'Warning'
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(LOG_LEVELS[DEFAULT_LOG_LEVEL])
+
+_file_handler = None
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def set_log_level(name):
+    """Altera o nível do logger do plugin (um dos nomes de LOG_LEVELS)."""
+    logger.setLevel(LOG_LEVELS[name])
+
+
+def log_level():
+    """Nome do nível atual (ver LOG_LEVELS)."""
+    level = logger.level
+    for name, value in LOG_LEVELS.items():
+        if value == level:
+            return name
+    return logging.getLevelName(level)
+
+
+def set_log_file(path):
+    """Encaminha também as mensagens para `path` (None desliga o ficheiro)."""
+    global _file_handler
+    if _file_handler is not None:
+        logger.removeHandler(_file_handler)
+        _file_handler.close()
+        _file_handler = None
+    if path:
+        _file_handler = logging.FileHandler(path, encoding='utf-8')
+        _file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(_file_handler)
+
+
+def log_file():
+    """Caminho do ficheiro de registo atual, ou None."""
+    return _file_handler.baseFilename if _file_handler is not None else None
+
+
+def log_limited(key, level, message, *args, interval=1.0):
+    """
+    Regista `message % args` no máximo uma vez por `interval` segundos para
+    cada `key`. As mensagens omitidas entretanto são contadas e indicadas na
+    mensagem seguinte.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    now = time.monotonic()
+    with _limits_lock:
+        last, suppressed = _limits.get(key, (None, 0))
+        if last is not None and now - last < interval:
+            _limits[key] = (last, suppressed + 1)
+            return
+        _limits[key] = (now, 0)
+    if suppressed:
+        logger.log(level, message + " (%d similar messages suppressed)", *args, suppressed)
+    else:
+        logger.log(level, message, *args)
+
+
+def configure_from_environment():
+    """Aplica RASTEREDIT_LOG_LEVEL e RASTEREDIT_LOG_FILE, se definidas."""
+    level = os.environ.get('RASTEREDIT_LOG_LEVEL', '').capitalize()
+    if level in LOG_LEVELS:
+        set_log_level(level)
+    path = os.environ.get('RASTEREDIT_LOG_FILE')
+    if path:
+        try:
+            set_log_file(path)
+        except OSError as e:
+            logger.error("Cannot open log file %s: %s", path, e)
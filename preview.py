@@ -0,0 +1,54 @@
+"""
+Pré-visualização temporária de uma interpolação sobre o mapa.
+
+O resultado é calculado num bloco de resolução reduzida e desenhado em tons
+de cinzento como um item do canvas, sem escrever nada no raster.
+"""
+import numpy as np
+from qgis.PyQt.QtGui import QImage, QPainter
+from qgis.gui import QgsMapCanvasItem
+
+# Fatores de redução da resolução disponíveis para a pré-visualização
+PREVIEW_FACTORS = (4, 8)
+
+
+def preview_image(array, no_data_value):
+    """
+    Imagem RGBA em tons de cinzento de `array`, com estiramento entre os
+    percentis 2 e 98 dos valores válidos. Os píxeis NoData ficam transparentes.
+    """
+    valid = array != no_data_value
+    if np.issubdtype(array.dtype, np.floating):
+        valid &= np.isfinite(array)
+
+    rows, cols = array.shape
+    rgba = np.zeros((rows, cols, 4), dtype=np.uint8)
+    if valid.any():
+        values = array[valid].astype(np.float64)
+        low, high = np.percentile(values, (2, 98))
+        scale = 255.0 / (high - low) if high > low else 0.0
+        gray = np.clip((values - low) * scale, 0, 255).astype(np.uint8)
+        rgba[valid, :3] = gray[:, None]
+        rgba[valid, 3] = 255
+
+    image = QImage(rgba.data, cols, rows, 4 * cols, QImage.Format_RGBA8888)
+    # Copiar para que a imagem não dependa do buffer NumPy
+    return image.copy()
+
+
+class PreviewOverlay(QgsMapCanvasItem):
+    """Item do canvas que desenha uma imagem sobre uma extensão do mapa."""
+
+    def __init__(self, canvas, image, extent):
+        super().__init__(canvas)
+        self.canvas = canvas
+        self.image = image
+        self.setRect(extent)
+
+    def paint(self, painter, option=None, widget=None):
+        # Píxeis nítidos: a pré-visualização mostra a resolução real do cálculo
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        painter.drawImage(self.boundingRect(), self.image)
+
+    def remove(self):
+        self.canvas.scene().removeItem(self)
@@ -0,0 +1,270 @@
+"""
+Algoritmos de Processing do RasterEditPlugin.
+
+Expõem as edições por polígonos (supressão e interpolação) a modelos, ao
+diálogo de execução em lote e ao `qgis_process`. A máscara é uma camada de
+polígonos; o raster de entrada não é alterado e o resultado é escrito numa
+cópia, mosaico a mosaico, com o mesmo motor da edição em lote do plugin.
+"""
+import os
+import time
+
+import numpy as np
+from qgis.PyQt.QtGui import QIcon
+from qgis.core import (QgsCoordinateTransform, QgsProcessing, QgsProcessingAlgorithm, QgsProcessingException,
+                       QgsProcessingParameterBand, QgsProcessingParameterBoolean, QgsProcessingParameterEnum,
+                       QgsProcessingParameterFeatureSource, QgsProcessingParameterNumber,
+                       QgsProcessingParameterRasterDestination, QgsProcessingParameterRasterLayer,
+                       QgsProcessingProvider, QgsRasterLayer)
+
+from .batch import INTERPOLATE, INTERPOLATE_ALL, SUPPRESS, apply_features, group_features, group_windows
+from .interpolation import (COMPONENT_RING_WIDTH, DEFAULT_IDW_NEIGHBORS, DEFAULT_IDW_POWER, DEFAULT_IDW_RADIUS,
+                            DEFAULT_TILE_HALO, DEFAULT_TILE_SIZE, METHODS, PRECISIONS)
+from .raster_io import block_extent, block_geotransform, copy_raster, feature_windows, read_block, write_block
+from .tasks import EditCanceled
+
+
+class RasterEditAlgorithm(QgsProcessingAlgorithm):
+    """Base dos algoritmos: entrada, máscara, opções de interpolação e saída."""
+
+    INPUT = 'INPUT'
+    MASK = 'MASK'
+    BANDS = 'BANDS'
+    METHOD = 'METHOD'
+    RING_WIDTH = 'RING_WIDTH'
+    FILL_HOLES_INDEPENDENTLY = 'FILL_HOLES_INDEPENDENTLY'
+    TILED = 'TILED'
+    TILE_SIZE = 'TILE_SIZE'
+    TILE_HALO = 'TILE_HALO'
+    PRECISION = 'PRECISION'
+    IDW_POWER = 'IDW_POWER'
+    IDW_NEIGHBORS = 'IDW_NEIGHBORS'
+    IDW_RADIUS = 'IDW_RADIUS'
+    OUTPUT = 'OUTPUT'
+
+    OPERATION = None
+
+    def group(self):
+        return 'Raster edit'
+
+    def groupId(self):
+        return 'rasteredit'
+
+    def createInstance(self):
+        return type(self)()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterRasterLayer(self.INPUT, 'Input raster'))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.MASK, 'Mask polygons', [QgsProcessing.TypeVectorPolygon]
+        ))
+        self.addParameter(QgsProcessingParameterBand(
+            self.BANDS, 'Bands to edit (all bands if none are selected)', parentLayerParameterName=self.INPUT,
+            optional=True, allowMultiple=True
+        ))
+        if self.OPERATION != SUPPRESS:
+            self.addParameter(QgsProcessingParameterEnum(
+                self.METHOD, 'Interpolation method', options=list(METHODS), defaultValue=0
+            ))
+            self.addParameter(QgsProcessingParameterNumber(
+                self.RING_WIDTH, 'Support ring width (pixels, 0 = all valid pixels in the block)',
+                type=QgsProcessingParameterNumber.Integer, defaultValue=0, minValue=0
+            ))
+            if self.OPERATION == INTERPOLATE:
+                self.addParameter(QgsProcessingParameterBoolean(
+                    self.FILL_HOLES_INDEPENDENTLY, 'Fill holes independently', defaultValue=False
+                ))
+            self.addParameter(QgsProcessingParameterBoolean(
+                self.TILED, 'Tiled interpolation', defaultValue=False
+            ))
+            self.addParameter(QgsProcessingParameterNumber(
+                self.TILE_SIZE, 'Tile size (pixels)',
+                type=QgsProcessingParameterNumber.Integer, defaultValue=DEFAULT_TILE_SIZE, minValue=16
+            ))
+            self.addParameter(QgsProcessingParameterNumber(
+                self.TILE_HALO, 'Tile halo (pixels)',
+                type=QgsProcessingParameterNumber.Integer, defaultValue=DEFAULT_TILE_HALO, minValue=2
+            ))
+            self.addParameter(QgsProcessingParameterEnum(
+                self.PRECISION, 'Compute precision', options=list(PRECISIONS), defaultValue=0
+            ))
+            self.addParameter(QgsProcessingParameterNumber(
+                self.IDW_POWER, 'IDW power',
+                type=QgsProcessingParameterNumber.Double, defaultValue=DEFAULT_IDW_POWER, minValue=0.1
+            ))
+            self.addParameter(QgsProcessingParameterNumber(
+                self.IDW_NEIGHBORS, 'IDW nearest neighbours',
+                type=QgsProcessingParameterNumber.Integer, defaultValue=DEFAULT_IDW_NEIGHBORS, minValue=1
+            ))
+            self.addParameter(QgsProcessingParameterNumber(
+                self.IDW_RADIUS, 'IDW search radius (pixels, 0 = unlimited)',
+                type=QgsProcessingParameterNumber.Double, defaultValue=DEFAULT_IDW_RADIUS, minValue=0
+            ))
+        self.addParameter(QgsProcessingParameterRasterDestination(self.OUTPUT, 'Edited raster'))
+
+    def interpolation_settings(self, parameters, context):
+        """Opções de interpolate_polygon a partir dos parâmetros do algoritmo."""
+        components = (self.OPERATION == INTERPOLATE and
+                      self.parameterAsBool(parameters, self.FILL_HOLES_INDEPENDENTLY, context))
+        return {
+            'method': METHODS[self.parameterAsEnum(parameters, self.METHOD, context)],
+            'ring_width': self.parameterAsInt(parameters, self.RING_WIDTH, context),
+            'components': components,
+            'tiled': self.parameterAsBool(parameters, self.TILED, context) and not components,
+            'tile_size': self.parameterAsInt(parameters, self.TILE_SIZE, context),
+            'halo': self.parameterAsInt(parameters, self.TILE_HALO, context),
+            'precision': list(PRECISIONS)[self.parameterAsEnum(parameters, self.PRECISION, context)],
+            'workers': os.cpu_count() or 1,
+            'idw_power': self.parameterAsDouble(parameters, self.IDW_POWER, context),
+            'idw_neighbors': self.parameterAsInt(parameters, self.IDW_NEIGHBORS, context),
+            'idw_radius': self.parameterAsDouble(parameters, self.IDW_RADIUS, context)
+        }
+
+    def processAlgorithm(self, parameters, context, feedback):
+        raster_layer = self.parameterAsRasterLayer(parameters, self.INPUT, context)
+        if raster_layer is None:
+            raise QgsProcessingException(self.invalidRasterError(parameters, self.INPUT))
+        source = self.parameterAsSource(parameters, self.MASK, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.MASK))
+        bands = sorted(set(self.parameterAsInts(parameters, self.BANDS, context)))
+        bands = bands or list(range(1, raster_layer.bandCount() + 1))
+        input_provider = raster_layer.dataProvider()
+        if not all(input_provider.sourceHasNoDataValue(band) for band in bands):
+            raise QgsProcessingException("Every band to edit needs a NoData value.")
+        if len({input_provider.dataType(band) for band in bands}) > 1:
+            raise QgsProcessingException("The bands to edit have different data types.")
+        output = self.parameterAsOutputLayer(parameters, self.OUTPUT, context)
+
+        settings, margin = None, 0
+        if self.OPERATION != SUPPRESS:
+            settings = self.interpolation_settings(parameters, context)
+            margin = settings['ring_width']
+            if settings['components']:
+                margin = max(margin, COMPONENT_RING_WIDTH)
+            if settings['tiled']:
+                margin = max(margin, settings['halo'])
+            if settings['method'] == 'idw' and settings['idw_radius'] > 0:
+                margin = max(margin, int(np.ceil(settings['idw_radius'])))
+
+        feedback.pushInfo("Copying input raster...")
+        try:
+            copy_raster(raster_layer, output, context.transformContext())
+        except ValueError as e:
+            raise QgsProcessingException(str(e))
+        output_layer = QgsRasterLayer(output, 'edited', 'gdal')
+        if not output_layer.isValid():
+            raise QgsProcessingException(f"Cannot open the output raster {output}.")
+        provider = output_layer.dataProvider()
+        data_type = provider.dataType(bands[0])
+        no_data = [provider.sourceNoDataValue(band) for band in bands]
+
+        transform = None
+        if source.sourceCrs() != output_layer.crs():
+            transform = QgsCoordinateTransform(source.sourceCrs(), output_layer.crs(), context.transformContext())
+        windows, rings, skipped = feature_windows(source.getFeatures(), output_layer, margin, transform)
+        if skipped:
+            feedback.reportError(f"{skipped} features were not polygons and were skipped.")
+        if not windows:
+            feedback.reportError("No polygons overlap the raster.")
+            return {self.OUTPUT: output}
+
+        groups = group_windows(windows)
+        geotransform = block_geotransform(output_layer, 0, 0)
+        edited = pixels = failed = 0
+        start = time.perf_counter()
+
+        provider.setEditable(True)
+        try:
+            for number, (window, indices) in enumerate(groups):
+                x_min, y_min, x_max, y_max = window
+                n_cols, n_rows = x_max - x_min + 1, y_max - y_min + 1
+                extent = block_extent(output_layer, x_min, y_min, n_cols, n_rows)
+                # Bloco com todas as bandas; a máscara é calculada uma vez por polígono
+                array = np.stack([read_block(provider, extent, n_cols, n_rows, band) for band in bands])
+                features = group_features(window, indices, windows, rings, geotransform)
+
+                def checkpoint(progress, number=number):
+                    feedback.setProgress(100 * (number + progress / 100) / len(groups))
+                    if feedback.isCanceled():
+                        raise EditCanceled()
+
+                try:
+                    stats = apply_features(array, features, no_data, self.OPERATION, settings, checkpoint)
+                except EditCanceled:
+                    # A cópia de saída fica incompleta: o algoritmo falha
+                    raise QgsProcessingException("Canceled")
+                for band, band_array in zip(bands, array):
+                    write_block(provider, band_array, data_type, x_min, y_min, band)
+                edited += stats[0]
+                pixels += stats[1]
+                failed += stats[2]
+        except ValueError as e:
+            raise QgsProcessingException(str(e))
+        finally:
+            provider.setEditable(False)
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        feedback.pushInfo(
+            f"{edited} polygons in {len(groups)} tiles in {elapsed:.1f} s "
+            f"({edited / elapsed:.1f} features/s, {pixels / elapsed:,.0f} pixels/s)."
+        )
+        if failed:
+            feedback.reportError(f"{failed} polygons had no valid pixels around them and were skipped.")
+        return {self.OUTPUT: output}
+
+
+class SuppressAlgorithm(RasterEditAlgorithm):
+    OPERATION = SUPPRESS
+
+    def name(self):
+        return 'suppress'
+
+    def displayName(self):
+        return 'Suppress values in polygons'
+
+    def shortHelpString(self):
+        return "Sets every pixel inside the mask polygons to the raster's NoData value."
+
+
+class InterpolateAlgorithm(RasterEditAlgorithm):
+    OPERATION = INTERPOLATE
+
+    def name(self):
+        return 'interpolatenodata'
+
+    def displayName(self):
+        return 'Interpolate NoData in polygons'
+
+    def shortHelpString(self):
+        return "Fills the NoData pixels inside the mask polygons from the valid pixels around them."
+
+
+class InterpolateAllAlgorithm(RasterEditAlgorithm):
+    OPERATION = INTERPOLATE_ALL
+
+    def name(self):
+        return 'interpolateall'
+
+    def displayName(self):
+        return 'Interpolate all values in polygons'
+
+    def shortHelpString(self):
+        return "Replaces every pixel inside the mask polygons with values interpolated from the pixels around them."
+
+
+class RasterEditProvider(QgsProcessingProvider):
+    """Fornecedor de Processing com os algoritmos do plugin."""
+
+    def loadAlgorithms(self):
+        for algorithm in (SuppressAlgorithm, InterpolateAlgorithm, InterpolateAllAlgorithm):
+            self.addAlgorithm(algorithm())
+
+    def id(self):
+        return 'rasteredit'
+
+    def name(self):
+        return 'Raster Edit'
+
+    def icon(self):
+        return QIcon(':/plugins/RasterEditPlugin/icons/interpolate.png')
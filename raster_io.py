@@ -0,0 +1,198 @@
+"""
+Leitura e escrita de blocos raster através dos providers do QGIS.
+
+Funções partilhadas pelas ferramentas interativas, pela edição em lote e
+pelos algoritmos de Processing.
+"""
+import os
+
+import numpy as np
+from qgis.core import (Qgis, QgsGeometry, QgsRasterBlock, QgsRasterFileWriter, QgsRasterPipe, QgsRectangle,
+                       QgsWkbTypes)
+
+
+def qgis_dtype_to_numpy(qgis_dtype):
+    """
+    Converte o tipo de dados QGIS/GDAL para o dtype NumPy correspondente.
+    """
+    dtype_map = {
+        Qgis.Byte: np.uint8,
+        Qgis.UInt16: np.uint16,
+        Qgis.Int16: np.int16,
+        Qgis.UInt32: np.uint32,
+        Qgis.Int32: np.int32,
+        Qgis.Float32: np.float32,
+        Qgis.Float64: np.float64,
+    }
+    # Para QGIS 3.30+, os tipos podem estar em Qgis.DataType
+    if hasattr(Qgis, 'DataType'):
+        dtype_map.update({
+            Qgis.DataType.Byte: np.uint8,
+            Qgis.DataType.UInt16: np.uint16,
+            Qgis.DataType.Int16: np.int16,
+            Qgis.DataType.UInt32: np.uint32,
+            Qgis.DataType.Int32: np.int32,
+            Qgis.DataType.Float32: np.float32,
+            Qgis.DataType.Float64: np.float64,
+        })
+    return dtype_map.get(qgis_dtype, np.float32)  # fallback para float32
+
+
+def pixel_bounds(rectangle, cols, rows, raster_layer, margin=0):
+    """
+    Janela de píxeis (x_min, y_min, x_max, y_max), inclusiva, que cobre
+    `rectangle` (coordenadas de mapa), alargada de `margin` píxeis e limitada
+    às dimensões do raster.
+    """
+    # Convert map coordinates to pixel coordinates
+    x_min = int((rectangle.xMinimum() - raster_layer.extent().xMinimum()) / raster_layer.rasterUnitsPerPixelX())
+    y_min = int((raster_layer.extent().yMaximum() - rectangle.yMaximum()) / raster_layer.rasterUnitsPerPixelY())
+    x_max = int((rectangle.xMaximum() - raster_layer.extent().xMinimum()) / raster_layer.rasterUnitsPerPixelX())
+    y_max = int((raster_layer.extent().yMaximum() - rectangle.yMinimum()) / raster_layer.rasterUnitsPerPixelY())
+
+    # Expand by an optional margin (in pixels) around the rectangle
+    x_min -= margin
+    y_min -= margin
+    x_max += margin
+    y_max += margin
+
+    # Ensure bounds are within raster dimensions
+    x_min = max(0, min(x_min, cols - 1))
+    y_min = max(0, min(y_min, rows - 1))
+    x_max = max(0, min(x_max, cols - 1))
+    y_max = max(0, min(y_max, rows - 1))
+
+    return x_min, y_min, x_max, y_max
+
+
+def block_extent(raster_layer, x_min, y_min, n_cols, n_rows):
+    """
+    Extensão em coordenadas de mapa de um bloco de n_cols x n_rows píxeis
+    com canto superior esquerdo no píxel (x_min, y_min).
+    """
+    res_x = raster_layer.rasterUnitsPerPixelX()
+    res_y = raster_layer.rasterUnitsPerPixelY()
+    extent = raster_layer.extent()
+    return QgsRectangle(
+        extent.xMinimum() + x_min * res_x,
+        extent.yMaximum() - (y_min + n_rows) * res_y,
+        extent.xMinimum() + (x_min + n_cols) * res_x,
+        extent.yMaximum() - y_min * res_y
+    )
+
+
+def block_geotransform(raster_layer, x_min, y_min):
+    """
+    Geotransform (convenção GDAL) do bloco com canto superior esquerdo
+    no píxel (x_min, y_min).
+    """
+    res_x = raster_layer.rasterUnitsPerPixelX()
+    res_y = raster_layer.rasterUnitsPerPixelY()
+    extent = raster_layer.extent()
+    return (extent.xMinimum() + x_min * res_x, res_x, 0.0,
+            extent.yMaximum() - y_min * res_y, 0.0, -res_y)
+
+
+def read_block(provider, extent, n_cols, n_rows, band=1):
+    """
+    Lê um bloco de n_cols x n_rows píxeis sobre `extent` como array NumPy no
+    tipo nativo da banda (só de leitura; usar .copy() para o alterar).
+    """
+    input_block = provider.block(band, extent, n_cols, n_rows)
+    if not input_block or input_block.isEmpty():
+        raise ValueError("Failed to retrieve raster block.")
+    native_dtype = qgis_dtype_to_numpy(provider.dataType(band))
+    return np.frombuffer(input_block.data(), dtype=native_dtype).reshape((n_rows, n_cols))
+
+
+def write_block(provider, array, data_type, x_min, y_min, band=1):
+    """Escreve `array` com canto superior esquerdo no píxel (x_min, y_min)."""
+    n_rows, n_cols = array.shape
+    output_block = QgsRasterBlock(data_type, n_cols, n_rows)
+    output_block.setData(array.tobytes())
+    if not provider.writeBlock(output_block, band, x_min, y_min):
+        raise ValueError("Failed to write raster block.")
+
+
+def parse_bands(text, band_count):
+    """
+    Converte uma seleção de bandas como "1,3,5-7" na lista ordenada das
+    bandas (numeradas a partir de 1). Texto vazio ou "all" seleciona todas.
+    """
+    text = text.strip().lower()
+    if text in ('', 'all'):
+        return list(range(1, band_count + 1))
+    bands = set()
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise ValueError(f"Invalid band selection: {part.strip()!r}") from None
+        if not 1 <= first <= last <= band_count:
+            raise ValueError(f"Bands must be between 1 and {band_count}: {part.strip()!r}")
+        bands.update(range(first, last + 1))
+    return sorted(bands)
+
+
+def copy_raster(raster_layer, path, transform_context=None, feedback=None):
+    """Escreve uma cópia integral do raster em `path` (formato pela extensão)."""
+    writer = QgsRasterFileWriter(path)
+    driver = QgsRasterFileWriter.driverForExtension(os.path.splitext(path)[1])
+    if driver:
+        writer.setOutputFormat(driver)
+    pipe = QgsRasterPipe()
+    provider = raster_layer.dataProvider()
+    if not pipe.set(provider.clone()):
+        raise ValueError("Cannot set pipe provider")
+    if transform_context is not None:
+        result = writer.writeRaster(pipe, provider.xSize(), provider.ySize(), provider.extent(),
+                                    provider.crs(), transform_context, feedback)
+    else:
+        result = writer.writeRaster(pipe, provider.xSize(), provider.ySize(), provider.extent(), provider.crs())
+    if result != 0:  # QgsRasterFileWriter retorna 0 para sucesso
+        raise ValueError("Failed to write raster")
+
+
+def geometry_rings(geometry):
+    """
+    Anéis (exteriores e interiores) de todas as partes de um polígono. As
+    geometrias curvas (CurvePolygon, MultiSurface) são primeiro convertidas
+    em segmentos de reta. Devolve uma lista vazia se a geometria não for um
+    polígono.
+    """
+    if QgsWkbTypes.isCurvedType(geometry.wkbType()):
+        geometry = QgsGeometry(geometry.constGet().segmentize())
+    parts = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+    return [[(p.x(), p.y()) for p in ring] for part in parts for ring in part]
+
+
+def feature_windows(features, raster_layer, margin=0, transform=None):
+    """
+    Janelas de píxeis (ver pixel_bounds, alargadas de `margin`) e anéis dos
+    polígonos de `features` que intersetam o raster. Com `transform`
+    (QgsCoordinateTransform) as geometrias são primeiro reprojetadas para o
+    SRC do raster. Os elementos sem anéis (p.ex. geometrias que não são
+    polígonos) são ignorados. Devolve (janelas, anéis, elementos ignorados).
+    """
+    provider = raster_layer.dataProvider()
+    windows, rings = [], []
+    skipped = 0
+    for feature in features:
+        geometry = QgsGeometry(feature.geometry())
+        if geometry.isEmpty():
+            continue
+        if transform is not None:
+            geometry.transform(transform)
+        bbox = geometry.boundingBox()
+        if not bbox.intersects(raster_layer.extent()):
+            continue
+        feature_rings = geometry_rings(geometry)
+        if not feature_rings:
+            # Anéis vazios seriam tratados como o bloco inteiro pelo motor
+            skipped += 1
+            continue
+        windows.append(pixel_bounds(bbox, provider.xSize(), provider.ySize(), raster_layer, margin))
+        rings.append(feature_rings)
+    return windows, rings, skipped
@@ -1,73 +1,78 @@
 from . import resources
-from qgis.PyQt.QtCore import QObject, Qt, QSize
-from qgis.PyQt.QtGui import QIcon, QColor
-from qgis.PyQt.QtWidgets import QAction, QComboBox, QWidgetAction
+from qgis.PyQt.QtCore import QObject, Qt, QTimer
+from qgis.PyQt.QtGui import QIcon, QColor, QGuiApplication
+from qgis.PyQt.QtWidgets import QAction, QActionGroup, QComboBox, QFileDialog, QInputDialog, QMessageBox, QProgressBar, QPushButton, QSpinBox, QWidgetAction
 from qgis.gui import QgsMapTool, QgsRubberBand
-from qgis.core import (Qgis, QgsRasterLayer, QgsRasterDataProvider, 
-                      QgsWkbTypes, QgsGeometry, QgsPointXY, QgsRasterBlock, QgsRectangle, QgsProject, QgsRasterFileWriter, QgsRasterPipe)
+from qgis.core import (Qgis, QgsApplication, QgsCoordinateTransform, QgsRasterLayer, QgsVectorLayer,
+                      QgsWkbTypes, QgsGeometry, QgsProject)
 import numpy as np
-from scipy.interpolate import griddata
 import logging
 import os
+import sys
+import time
 
+from .batch import BATCH_OPERATIONS, INTERPOLATE_ALL, SUPPRESS, apply_features, group_features, group_windows
+from .interpolation import (COMPONENT_RING_WIDTH, DEFAULT_IDW_NEIGHBORS, DEFAULT_IDW_POWER, DEFAULT_IDW_RADIUS,
+                            DEFAULT_TILE_HALO, DEFAULT_TILE_SIZE, METHODS, PRECISIONS, triangulation_cache)
+from .history import HistoryStack, HistoryStore, format_bytes, make_record, record_values, swap_record
+from .journal import EditJournal, entry_record, journal_path, read_journal, replay
+from .raster_io import (block_extent, block_geotransform, copy_raster, feature_windows,
+                        parse_bands, pixel_bounds, read_block, write_block)
+from .preview import PREVIEW_FACTORS, PreviewOverlay, preview_image
+from .processing_provider import RasterEditProvider
+from .tasks import RasterEditTask
+from .tracing import NULL_SPAN, span, traced, tracer, write_trace
+from .log import (LOG_LEVELS, configure_from_environment, log_file, log_level, log_limited, logger,
+                  set_log_file, set_log_level)
 
-def qgis_dtype_to_numpy(qgis_dtype):
-    """
-    Converte o tipo de dados QGIS/GDAL para o dtype NumPy correspondente.
-    """
-    dtype_map = {
-        Qgis.Byte: np.uint8,
-        Qgis.UInt16: np.uint16,
-        Qgis.Int16: np.int16,
-        Qgis.UInt32: np.uint32,
-        Qgis.Int32: np.int32,
-        Qgis.Float32: np.float32,
-        Qgis.Float64: np.float64,
-    }
-    # Para QGIS 3.30+, os tipos podem estar em Qgis.DataType
-    if hasattr(Qgis, 'DataType'):
-        dtype_map.update({
-            Qgis.DataType.Byte: np.uint8,
-            Qgis.DataType.UInt16: np.uint16,
-            Qgis.DataType.Int16: np.int16,
-            Qgis.DataType.UInt32: np.uint32,
-            Qgis.DataType.Int32: np.int32,
-            Qgis.DataType.Float32: np.float32,
-            Qgis.DataType.Float64: np.float64,
-        })
-    return dtype_map.get(qgis_dtype, np.float32)  # fallback para float32
-
-# Configurar o logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Mostra mensagens DEBUG e superiores
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
-
-# Adicionar handler para a consola
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-console_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
-logging.getLogger().addHandler(console_handler)
+
+# Distância mínima (píxeis de ecrã) entre vértices no desenho à mão livre
+FREEHAND_TOLERANCE = 3
 
 
 class RasterEditTool(QgsMapTool):
-    def __init__(self, canvas, callback, iface):
+    """
+    Ferramenta de desenho do polígono de edição.
+
+    O rubber band é atualizado de forma incremental: contém os vértices
+    fixados e um último vértice flutuante que segue o cursor, e só esse
+    vértice é movido a cada movimento do rato. Os redesenhos são agrupados
+    ao ritmo de atualização do ecrã. Em modo `freehand`, arrastar com o
+    botão esquerdo premido acrescenta vértices sempre que o cursor se afasta
+    mais de `tolerance` píxeis de ecrã do último vértice.
+    """
+
+    def __init__(self, canvas, callback, iface, freehand=False, tolerance=FREEHAND_TOLERANCE):
         super().__init__(canvas)
         self.canvas = canvas
         self.callback = callback
         self.iface = iface
+        self.freehand = freehand
+        self.tolerance = tolerance
         self.rubberBand = None
         self.isDrawing = False
+        self.isDragging = False
         self.points = []
+        
+        # Posição do cursor ainda não desenhada e temporizador de redesenho
+        self.pendingPoint = None
+        self.redrawTimer = QTimer()
+        self.redrawTimer.setSingleShot(True)
+        screen = QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 60
+        self.redrawTimer.setInterval(max(1, int(1000 / (refresh_rate or 60))))
+        self.redrawTimer.timeout.connect(self.moveFloatingVertex)
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Escape:
             if self.isDrawing:
+                self.redrawTimer.stop()
                 if self.rubberBand:
                     self.canvas.scene().removeItem(self.rubberBand)
                     self.rubberBand = None
                 self.points = []
                 self.isDrawing = False
+                self.isDragging = False
                 self.iface.messageBar().pushMessage(
                     "Edit Canceled",
                     "Drawing operation canceled.",
@@ -96,36 +101,46 @@ class RasterEditTool(QgsMapTool):
                     self.rubberBand.setColor(QColor(255, 0, 0, 100))
                     self.rubberBand.setWidth(1)
             point = self.toMapCoordinates(event.pos())
-            self.points.append(point)
-            self.updateRubberBand()
+            self.addVertex(point)
+            self.isDragging = self.freehand
         elif event.button() == Qt.RightButton and self.isDrawing:
             self.finishDrawing()
+
     def canvasMoveEvent(self, event):
         if self.isDrawing and self.rubberBand:
             point = self.toMapCoordinates(event.pos())
-            temp_points = self.points + [point]
-            if len(temp_points) >= 2:
-                try:
-                    self.rubberBand.setToGeometry(
-                        QgsGeometry.fromPolygonXY([temp_points])
-                    )
-                except Exception:
-                    pass
+            if self.isDragging and self.points:
+                # Desenho à mão livre: fixar um vértice a cada `tolerance` píxeis
+                last = self.points[-1]
+                tolerance = self.tolerance * self.canvas.mapUnitsPerPixel()
+                if (point.x() - last.x()) ** 2 + (point.y() - last.y()) ** 2 >= tolerance ** 2:
+                    self.addVertex(point)
+                    return
+            # Mover o vértice flutuante no próximo redesenho do ecrã
+            self.pendingPoint = point
+            if not self.redrawTimer.isActive():
+                self.redrawTimer.start()
 
-    def updateRubberBand(self):
-        if len(self.points) >= 2:
-            try:
-                self.rubberBand.setToGeometry(
-                    QgsGeometry.fromPolygonXY([self.points])
-                )
-            except Exception:
-                self.iface.messageBar().pushMessage(
-                    "Warning",
-                    "Error updating polygon preview.",
-                    level=Qgis.Warning
-                )
+    def addVertex(self, point):
+        """Fixa um vértice e acrescenta um novo vértice flutuante no mesmo ponto."""
+        self.redrawTimer.stop()
+        self.pendingPoint = None
+        self.points.append(point)
+        if len(self.points) == 1:
+            self.rubberBand.reset(QgsWkbTypes.PolygonGeometry)
+            self.rubberBand.addPoint(point, False)
+        else:
+            self.rubberBand.movePoint(point)
+        self.rubberBand.addPoint(point, True)
+
+    def moveFloatingVertex(self):
+        if self.pendingPoint is not None and self.rubberBand and self.isDrawing:
+            self.rubberBand.movePoint(self.pendingPoint)
+        self.pendingPoint = None
 
     def finishDrawing(self):
+        self.redrawTimer.stop()
+        self.isDragging = False
         if self.isDrawing and len(self.points) >= 3:
             self.points.append(self.points[0])
             geometry = QgsGeometry.fromPolygonXY([self.points])
@@ -154,25 +169,57 @@ class RasterEditTool(QgsMapTool):
     def canvasReleaseEvent(self, event):
         if event.button() == Qt.RightButton:
             self.finishDrawing()
+        elif event.button() == Qt.LeftButton:
+            self.isDragging = False
 
 class RasterEditPlugin(QObject):
     def __init__(self, iface):
         super().__init__()
         self.iface = iface
-        self.canvas = iface.mapCanvas()
-        self.undoStack = []
-        self.redoStack = []  # Novo stack para REDO
+        configure_from_environment()
+        self.startup_times = {}  # Segundos gastos por fase do arranque
+        # Sem iface (qgis_process) só os algoritmos de Processing são carregados
+        self.canvas = iface.mapCanvas() if iface is not None else None
+        # Histórico com orçamento de memória partilhado (excedentes vão para disco)
+        self.history_store = HistoryStore()
+        self.undoStack = HistoryStack(self.history_store)
+        self.redoStack = HistoryStack(self.history_store)  # Novo stack para REDO
+        self.journal = None  # Diário persistente do raster em edição
         self.suppress_tool = None
         self.interpolate_tool = None
-        self.setupActions()
+        self.edit_task = None  # QgsTask da edição em curso
+        self.edit_progress = None
+        # Parâmetros da interpolação por mosaicos (píxeis)
+        self.tile_size = DEFAULT_TILE_SIZE
+        self.tile_halo = DEFAULT_TILE_HALO
+        self.edit_bands = None  # Bandas a editar (None = todas)
+        # Parâmetros do método IDW (raio em píxeis; 0 = sem limite)
+        self.idw_power = DEFAULT_IDW_POWER
+        self.idw_neighbors = DEFAULT_IDW_NEIGHBORS
+        self.idw_radius = DEFAULT_IDW_RADIUS
+        self.preview_overlay = None  # Pré-visualização à espera de aceitação
+        self.preview_message = None
+        self.batch = None  # Estado da edição em lote em curso
+        self.provider = None  # Fornecedor de Processing
+        if iface is not None:
+            self.setupActions()
 
 
+    @traced('redo_last_edit')
     def redo_last_edit(self):
-        logging.debug("Iniciando a função redo_last_edit...")
+        logger.debug("Iniciando a função redo_last_edit...")
+        
+        # Não mexer no raster enquanto uma edição corre em segundo plano
+        if self.edit_task is not None:
+            self.iface.messageBar().pushMessage(
+                "Warning", "Wait for the running edit to finish before using Redo.",
+                level=Qgis.Warning
+            )
+            return
         
         # Verificar se há edições para refazer
         if not self.redoStack:
-            logging.warning("O redoStack está vazio. Não há edições para refazer.")
+            logger.warning("O redoStack está vazio. Não há edições para refazer.")
             self.iface.messageBar().pushMessage(
                 "Warning", "No edits to redo.",
                 level=Qgis.Warning
@@ -180,12 +227,13 @@ class RasterEditPlugin(QObject):
             return
             
         last_state = self.redoStack.pop()
-        logging.debug(f"Estado recuperado do redoStack: {last_state}")
+        logger.debug("Registo recuperado do redoStack: janela %dx%d em (%d, %d)",
+                     last_state['n_cols'], last_state['n_rows'], last_state['x_min'], last_state['y_min'])
         
         # Obter a camada raster ativa
         raster_layer = self.iface.activeLayer()
         if not isinstance(raster_layer, QgsRasterLayer):
-            logging.error("A camada ativa não é um raster. Operação cancelada.")
+            logger.error("A camada ativa não é um raster. Operação cancelada.")
             self.iface.messageBar().pushMessage(
                 "Error", "Active layer is not a raster.",
                 level=Qgis.Critical
@@ -196,84 +244,30 @@ class RasterEditPlugin(QObject):
         
         try:
             # Tornar a camada editável
-            logging.debug("Tornando o raster editável...")
+            logger.debug("Tornando o raster editável...")
             provider.setEditable(True)
             
-            # Validar integridade do bloco do redoStack
-            redo_block = last_state['block']
-            if not isinstance(redo_block, QgsRasterBlock):
-                raise ValueError("Bloco do redoStack não é um QgsRasterBlock válido.")
-            if redo_block.isEmpty():
-                raise ValueError("Bloco do redoStack está vazio.")
-                
-            # Capturar o estado atual para o undoStack
-            logging.debug("Capturando o estado atual para o undoStack...")
-            current_extent = QgsRectangle(
-                raster_layer.extent().xMinimum() + last_state['x_min'] * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - (last_state['y_min'] + last_state['n_rows']) * raster_layer.rasterUnitsPerPixelY(),
-                raster_layer.extent().xMinimum() + (last_state['x_min'] + last_state['n_cols']) * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - last_state['y_min'] * raster_layer.rasterUnitsPerPixelY()
-            )
-            
-            logging.debug(f"Extensão calculada: {current_extent.toString()}")
-            
-            current_block = provider.block(
-                1,
-                current_extent,
-                last_state['n_cols'],
-                last_state['n_rows']
-            )
-            
-            if current_block.isEmpty():
-                raise ValueError("Falha ao capturar o estado atual para o undoStack.")
-                
-            # Validar consistência do bloco capturado
-            if (current_block.width() != last_state['n_cols'] or
-                current_block.height() != last_state['n_rows']):
-                raise ValueError("Dimensões do bloco atual não correspondem ao estado salvo.")
-                
-            logging.debug(f"Bloco capturado para o undoStack: {current_block.width()}x{current_block.height()}")
-            
-            undo_state = {
-                'block': QgsRasterBlock(current_block.dataType(),
-                                      current_block.width(),
-                                      current_block.height()),
-                'x_min': last_state['x_min'],
-                'y_min': last_state['y_min'],
-                'n_cols': last_state['n_cols'],
-                'n_rows': last_state['n_rows'],
-                'data_type': last_state['data_type']
-            }
-            
-            undo_state['block'].setData(current_block.data())
-            logging.debug(f"Estado capturado para o undoStack (dados): {undo_state}")
-            
-            # Adicionar ao undoStack
+            # Repor os píxeis do redoStack e capturar o estado atual para o undoStack
+            logger.debug("Aplicando o registo do redoStack ao raster...")
+            undo_state = self.apply_state(raster_layer, last_state)
             self.undoStack.append(undo_state)
-            
-            # Aplicar o bloco do redoStack
-            logging.debug("Escrevendo o bloco do redoStack no raster...")
-            success = provider.writeBlock(
-                redo_block, 1,
-                last_state['x_min'],
-                last_state['y_min']
-            )
-            
-            if not success:
-                raise ValueError("Falha ao escrever o bloco do redoStack no raster.")
-                
-            logging.debug("Bloco escrito com sucesso no raster.")
+            logger.debug("Registo do redoStack aplicado com sucesso ao raster.")
             
             provider.setEditable(False)
             raster_layer.triggerRepaint()
-            logging.debug("Repaint do raster acionado.")
+            logger.debug("Repaint do raster acionado.")
+            
+            journal = self.journal_for(raster_layer)
+            if journal is not None:
+                journal.record_redo()
             
             # Habilitar a ação UNDO
             self.undo_action.setEnabled(True)
+            self.update_history_status()
             
         except Exception as e:
             provider.setEditable(False)
-            logging.error(f"Erro durante o REDO: {str(e)}", exc_info=True)
+            logger.error("Erro durante o REDO: %s", e, exc_info=True)
             self.iface.messageBar().pushMessage(
                 "Error", f"Erro durante o REDO: {str(e)}",
                 level=Qgis.Critical
@@ -281,7 +275,7 @@ class RasterEditPlugin(QObject):
             
         # Desabilitar REDO se o redoStack estiver vazio
         if not self.redoStack:
-            logging.debug("O redoStack está agora vazio. Desabilitando a ação REDO.")
+            logger.debug("O redoStack está agora vazio. Desabilitando a ação REDO.")
             self.redo_action.setEnabled(False)
 
     def setupActions(self):
@@ -347,19 +341,143 @@ class RasterEditPlugin(QObject):
         self.deactivate_edit_action.triggered.connect(self.deactivate_tool)
         self.deactivate_edit_action.setEnabled(False)
     
+        # Precisão de cálculo da interpolação (grupo exclusivo no menu)
+        self.precision_group = QActionGroup(self.iface.mainWindow())
+        self.precision_actions = {}
+        for precision in PRECISIONS:
+            action = QAction(f'Interpolation Precision: {precision.capitalize()}', self.iface.mainWindow())
+            action.setCheckable(True)
+            action.setChecked(precision == 'auto')
+            self.precision_group.addAction(action)
+            self.precision_actions[precision] = action
+        self.precision_actions['auto'].setToolTip(
+            'Float32 for Float32 and 8/16-bit integer rasters, Float64 otherwise'
+        )
+    
+        self.history_budget_action = QAction(
+            'History Memory Budget...',
+            self.iface.mainWindow()
+        )
+        self.history_budget_action.triggered.connect(self.configure_history_budget)
+    
+        # Registo de tempos por etapa (Chrome/Perfetto trace)
+        self.trace_action = QAction(
+            'Record Performance Trace',
+            self.iface.mainWindow()
+        )
+        self.trace_action.setCheckable(True)
+        self.trace_action.setToolTip('Record per-stage timings and save them as a Chrome/Perfetto trace')
+        self.trace_action.toggled.connect(self.toggle_trace)
+    
+        # Nível do registo do plugin e ficheiro opcional
+        self.log_level_action = QAction(
+            'Log Level...',
+            self.iface.mainWindow()
+        )
+        self.log_level_action.triggered.connect(self.configure_log_level)
+        self.log_file_action = QAction(
+            'Log to File...',
+            self.iface.mainWindow()
+        )
+        self.log_file_action.setCheckable(True)
+        self.log_file_action.setChecked(log_file() is not None)
+        self.log_file_action.toggled.connect(self.toggle_log_file)
+    
         # Criar ComboBox para métodos de interpolação
         self.method_combo = QComboBox()
-        self.method_combo.addItems(['linear', 'cubic', 'nearest'])
+        self.method_combo.addItems(METHODS)
         self.method_combo.setToolTip('Select interpolation method')
         
         # Adicionar o ComboBox à toolbar
         self.method_action = QWidgetAction(self.iface.mainWindow())
         self.method_action.setDefaultWidget(self.method_combo)
+        
+        # SpinBox para a largura do anel de suporte (0 = todos os píxeis válidos)
+        self.ring_spin = QSpinBox()
+        self.ring_spin.setRange(0, 1000)
+        self.ring_spin.setSuffix(' px')
+        self.ring_spin.setSpecialValueText('All pixels')
+        self.ring_spin.setToolTip('Support ring: use only valid pixels within this distance of the area to interpolate')
+        
+        self.ring_action = QWidgetAction(self.iface.mainWindow())
+        self.ring_action.setDefaultWidget(self.ring_spin)
+        
+        # Opção para interpolar cada buraco de forma independente
+        self.components_action = QAction(
+            'Fill Holes Independently',
+            self.iface.mainWindow()
+        )
+        self.components_action.setCheckable(True)
+        self.components_action.setToolTip('Interpolate each NoData hole separately from its own support ring')
+        
+        # Opção para interpolar áreas grandes por mosaicos com halo
+        self.tiled_action = QAction(
+            'Interpolate in Tiles',
+            self.iface.mainWindow()
+        )
+        self.tiled_action.setCheckable(True)
+        self.tiled_action.setToolTip('Interpolate large areas tile by tile from sources within a halo, blending the seams')
+        
+        self.tile_settings_action = QAction(
+            'Tile Size and Halo...',
+            self.iface.mainWindow()
+        )
+        self.tile_settings_action.triggered.connect(self.configure_tiles)
+        
+        self.idw_settings_action = QAction(
+            'IDW Settings...',
+            self.iface.mainWindow()
+        )
+        self.idw_settings_action.setToolTip('Power, number of neighbours and search radius of the idw method')
+        self.idw_settings_action.triggered.connect(self.configure_idw)
+        
+        # Bandas editadas por cada operação (por omissão todas)
+        self.bands_action = QAction(
+            'Bands to Edit...',
+            self.iface.mainWindow()
+        )
+        self.bands_action.setToolTip('Choose the bands that Suppress and Interpolate modify (default: all bands)')
+        self.bands_action.triggered.connect(self.configure_bands)
+        
+        # Desenho à mão livre (arrastar com o botão esquerdo premido)
+        self.freehand_action = QAction(
+            'Freehand Drawing',
+            self.iface.mainWindow()
+        )
+        self.freehand_action.setCheckable(True)
+        self.freehand_action.setToolTip('Drag with the left button pressed to add vertices continuously')
+        self.freehand_action.toggled.connect(self.set_freehand)
+        
+        # Pré-visualização em resolução reduzida antes de escrever
+        self.preview_action = QAction(
+            'Preview Interpolation Before Applying',
+            self.iface.mainWindow()
+        )
+        self.preview_action.setCheckable(True)
+        self.preview_action.setToolTip('Show a low-resolution preview of the interpolation and apply it only when accepted')
+        
+        self.preview_factor_group = QActionGroup(self.iface.mainWindow())
+        self.preview_factor_actions = {}
+        for factor in PREVIEW_FACTORS:
+            action = QAction(f'Preview Resolution: 1/{factor}', self.iface.mainWindow())
+            action.setCheckable(True)
+            action.setChecked(factor == PREVIEW_FACTORS[0])
+            self.preview_factor_group.addAction(action)
+            self.preview_factor_actions[factor] = action
+    
+        # Edição em lote a partir de uma camada de polígonos
+        self.batch_action = QAction(
+            'Batch Edit from Polygon Layer...',
+            self.iface.mainWindow()
+        )
+        self.batch_action.setToolTip('Apply an operation to every polygon (or the selected polygons) of a vector layer')
+        self.batch_action.triggered.connect(self.run_batch)
     
         # Configurar estados iniciais
         self.suppress_action.setEnabled(False)
         self.interpolate_action.setEnabled(False)
         self.interpolate_all_action.setEnabled(False)
+        self.batch_action.setEnabled(False)
         self.undo_action.setEnabled(False)
         self.redo_action.setEnabled(False)
         self.save_action.setEnabled(False)  # Alterado: inicia desabilitado
@@ -397,6 +515,7 @@ class RasterEditPlugin(QObject):
             self.suppress_action.setEnabled(True)
             self.interpolate_action.setEnabled(True)
             self.interpolate_all_action.setEnabled(True)
+            self.batch_action.setEnabled(True)
             self.save_action.setEnabled(False)  # Desativa save pois já é editável
             self.activate_edit_action.setEnabled(False)
             self.deactivate_edit_action.setEnabled(True)
@@ -406,6 +525,9 @@ class RasterEditPlugin(QObject):
                 "Editable layer detected. Edit mode activated.",
                 level=Qgis.Info
             )
+            
+            # Recuperar o histórico de sessões anteriores a partir do diário
+            self.open_journal(raster_layer)
         else:
             # Ativar apenas o botão de save
             self.save_action.setEnabled(True)
@@ -420,6 +542,10 @@ class RasterEditPlugin(QObject):
 
         
     def deactivate_tool(self):
+        # Cancelar uma edição em segundo plano que ainda esteja a correr
+        self.cancel_edit_task()
+        self.discard_preview()
+        
         # Restaurar todos os ícones para o estado normal
         self.suppress_action.setIcon(QIcon(':/plugins/RasterEditPlugin/icons/suppress.png'))
         self.interpolate_action.setIcon(QIcon(':/plugins/RasterEditPlugin/icons/interpolate.png'))
@@ -439,16 +565,21 @@ class RasterEditPlugin(QObject):
         self.suppress_action.setEnabled(False)
         self.interpolate_action.setEnabled(False)
         self.interpolate_all_action.setEnabled(False)
+        self.batch_action.setEnabled(False)
         
         # Atualizar estado dos botões
         self.activate_edit_action.setEnabled(True)
         self.deactivate_edit_action.setEnabled(False)
         
-        # Limpar as pilhas de undo/redo
+        # Limpar as pilhas de undo/redo (o diário preserva o histórico em disco)
+        self.close_journal()
         self.undoStack.clear()
         self.redoStack.clear()
+        self.history_store.release()
+        triangulation_cache.clear()
         self.undo_action.setEnabled(False)
         self.redo_action.setEnabled(False)
+        self.update_history_status()
         
         # Ativar a ferramenta Pan do QGIS
         self.iface.actionPan().trigger()
@@ -471,7 +602,8 @@ class RasterEditPlugin(QObject):
         self.suppress_tool = RasterEditTool(
             self.canvas,
             lambda rectangle, points: self.suppress_zone(rectangle, points),
-            self.iface)
+            self.iface,
+            freehand=self.freehand_action.isChecked())
         self.canvas.setMapTool(self.suppress_tool)
         self.iface.messageBar().pushMessage(
             "Raster Edit Tool",
@@ -480,6 +612,7 @@ class RasterEditPlugin(QObject):
         )
 
 
+    @traced('create_editable_copy')
     def create_editable_copy(self):
         raster_layer = self.iface.activeLayer()
         if not isinstance(raster_layer, QgsRasterLayer):
@@ -500,42 +633,35 @@ class RasterEditPlugin(QObject):
     
         try:
             # Criar cópia usando QgsRasterFileWriter
-            writer = QgsRasterFileWriter(new_path)
-            pipe = QgsRasterPipe()
             provider = raster_layer.dataProvider()
-            
-            if not pipe.set(provider.clone()):
-                raise ValueError("Cannot set pipe provider")
-                
-            success = writer.writeRaster(
-                pipe,
-                provider.xSize(),
-                provider.ySize(),
-                provider.extent(),
-                provider.crs()
-            )
-    
-            if success == 0:  # QgsRasterFileWriter retorna 0 para sucesso
-                # Carregar nova camada
-                new_layer = QgsRasterLayer(new_path, f"{raster_layer.name()}_edited")
-                if new_layer.isValid():
-                    QgsProject.instance().addMapLayer(new_layer)
-                    self.iface.setActiveLayer(new_layer)
+            with span('copy_raster', pixels=provider.xSize() * provider.ySize(),
+                      bytes=provider.xSize() * provider.ySize() * provider.dataTypeSize(1)):
+                copy_raster(raster_layer, new_path)
+            # Carregar nova camada
+            new_layer = QgsRasterLayer(new_path, f"{raster_layer.name()}_edited")
+            if new_layer.isValid():
+                QgsProject.instance().addMapLayer(new_layer)
+                self.iface.setActiveLayer(new_layer)
                     
-                    # Habilitar outras ações
-                    self.suppress_action.setEnabled(True)
-                    self.interpolate_action.setEnabled(True)
-                    self.interpolate_all_action.setEnabled(True)
+                # A cópia é nova: um diário antigo com o mesmo nome já não se aplica
+                self.close_journal()
+                if os.path.exists(journal_path(new_path)):
+                    os.remove(journal_path(new_path))
+                self.open_journal(new_layer)
                     
-                    self.iface.messageBar().pushMessage(
-                        "Success",
-                        "Editable copy created and activated.",
-                        level=Qgis.Success
-                    )
-                else:
-                    raise ValueError("Failed to load new layer")
+                # Habilitar outras ações
+                self.suppress_action.setEnabled(True)
+                self.interpolate_action.setEnabled(True)
+                self.interpolate_all_action.setEnabled(True)
+                self.batch_action.setEnabled(True)
+                    
+                self.iface.messageBar().pushMessage(
+                    "Success",
+                    "Editable copy created and activated.",
+                    level=Qgis.Success
+                )
             else:
-                raise ValueError("Failed to write raster")
+                raise ValueError("Failed to load new layer")
     
         except Exception as e:
             self.iface.messageBar().pushMessage(
@@ -545,84 +671,25 @@ class RasterEditPlugin(QObject):
             )
 
     def suppress_zone(self, rectangle, points):
-        raster_layer = self.iface.activeLayer()
-        if not isinstance(raster_layer, QgsRasterLayer):
-            self.iface.messageBar().pushMessage(
-                "Error",
-                "Please select a raster layer.",
-                level=Qgis.Warning
-            )
+        context = self.read_edit_block(rectangle, points, 'suppression', trace_name='suppress_zone')
+        if context is None:
             return
+        no_data_value = context['no_data']
+        vertices = context['vertices']
     
-        provider = raster_layer.dataProvider()
-        try:
-            provider.setEditable(True)
-            no_data_value = provider.sourceNoDataValue(1)
-    
-            # Calcular limites do bloco
-            x_min, y_min, x_max, y_max = self.calculate_bounds(rectangle, provider.xSize(), provider.ySize(), raster_layer)
-    
-            # Obter o bloco do raster
-            block_extent = QgsRectangle(
-                raster_layer.extent().xMinimum() + x_min * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - y_max * raster_layer.rasterUnitsPerPixelY() - raster_layer.rasterUnitsPerPixelY(),
-                raster_layer.extent().xMinimum() + (x_max + raster_layer.rasterUnitsPerPixelX()) * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - y_min * raster_layer.rasterUnitsPerPixelY()
-            )
-            logging.debug(f"Block extent: {block_extent}")
-    
-            input_block = provider.block(1,  # número da banda
-                                       block_extent,  # QgsRectangle com a extensão
-                                       int(x_max - x_min + 1),  # largura
-                                       int(y_max - y_min + 1))  # altura
-            if not input_block:
-                raise ValueError("Failed to retrieve raster block.")
-            self.save_state(raster_layer, x_min, y_min, input_block)
-    
-            # Detectar o dtype correto do raster
-            native_dtype = qgis_dtype_to_numpy(provider.dataType(1))
-            array = np.frombuffer(input_block.data(), dtype=native_dtype).reshape((y_max - y_min + 1, x_max - x_min + 1))
-            # Guardar tipo original e converter para float64 para operações
-            original_dtype = array.dtype
-            array = array.astype(np.float64)
-    
-            # Aplicar NoData à área especificada
-            if points:
-                polygon = QgsGeometry.fromPolygonXY([points])
-                mask = np.zeros(array.shape, dtype=bool)
-                for y in range(array.shape[0]):
-                    for x in range(array.shape[1]):
-                        map_x = block_extent.xMinimum() + x * raster_layer.rasterUnitsPerPixelX()
-                        map_y = block_extent.yMaximum() - y * raster_layer.rasterUnitsPerPixelY()
-                        if polygon.contains(QgsPointXY(map_x, map_y)):
-                            mask[y, x] = True
-                array[mask] = no_data_value
-            else:
-                array.fill(no_data_value)
-    
-            # Criar e gravar o bloco atualizado - converter de volta ao tipo original
-            output_block = QgsRasterBlock(provider.dataType(1), x_max - x_min + 1, y_max - y_min + 1)
-            output_block.setData(array.astype(original_dtype).tobytes())
-            success = provider.writeBlock(output_block, 1, x_min, y_min)
-            if not success:
-                raise ValueError("Failed to write raster block.")
+        def compute(task):
+            from .engine import suppress
     
-            provider.setEditable(False)
-            raster_layer.triggerRepaint()
-            self.iface.messageBar().pushMessage(
-                "Suppress Completed",
-                "Selected area replaced with NoData.",
-                level=Qgis.Success
+            # Aplicar NoData à área especificada, no tipo nativo do raster
+            result, context['changed'] = suppress(
+                context['array'], context['geotransform'], vertices, no_data_value, task.checkpoint
             )
+            return result
     
-        except Exception as e:
-            provider.setEditable(False)
-            logging.error(f"Error during suppression: {str(e)}")
-            self.iface.messageBar().pushMessage(
-                "Error",
-                f"Error during suppression: {str(e)}",
-                level=Qgis.Critical
-            )
+        self.start_edit_task(
+            context, "Suppressing raster values", compute,
+            "Suppress Completed", "Selected area replaced with NoData."
+        )
 
 
     def activate_interpolate_tool(self):
@@ -635,7 +702,8 @@ class RasterEditPlugin(QObject):
         self.interpolate_tool = RasterEditTool(
             self.canvas,
             lambda rectangle, points: self.interpolate_zone(rectangle, points),
-            self.iface)
+            self.iface,
+            freehand=self.freehand_action.isChecked())
         self.canvas.setMapTool(self.interpolate_tool)
         self.iface.messageBar().pushMessage(
             "Raster Edit Tool",
@@ -643,7 +711,156 @@ class RasterEditPlugin(QObject):
             level=Qgis.Info
         )
 
-    def interpolate_zone(self, rectangle, points):
+    def interpolate_zone(self, rectangle, points, preview=True):
+        preview = preview and self.preview_action.isChecked()
+        decimation = self.preview_factor() if preview else 1
+        settings = self.interpolation_settings(decimation, all_values=False)
+        # Calcular limites do bloco (alargados pelo anel de suporte)
+        margin = self.interpolation_margin(settings)
+        context = self.read_edit_block(rectangle, points, 'interpolation', margin, decimation,
+                                       trace_name='interpolate_zone')
+        if context is None:
+            return
+    
+        def compute(task):
+            # Motor e SciPy só são importados na primeira interpolação
+            from .engine import interpolate
+            result, context['changed'] = interpolate(
+                context['array'], context['geotransform'], context['vertices'], context['no_data'],
+                checkpoint=task.checkpoint, **settings
+            )
+            return result
+    
+        if preview:
+            self.start_preview_task(context, compute, rectangle, points, self.interpolate_zone)
+            return
+        self.start_edit_task(
+            context, "Interpolating NoData values", compute,
+            "Interpolation Completed", "Raster values interpolated successfully."
+        )
+
+    def activate_interpolate_all_tool(self):
+        # Restaurar ícones das outras ferramentas
+        self.suppress_action.setIcon(QIcon(':/plugins/RasterEditPlugin/icons/suppress.png'))
+        self.interpolate_action.setIcon(QIcon(':/plugins/RasterEditPlugin/icons/interpolate.png'))
+        
+        # Ativar ícone desta ferramenta
+        self.interpolate_all_action.setIcon(QIcon(':/plugins/RasterEditPlugin/icons/interpolate_all_active.png'))
+        self.interpolate_all_tool = RasterEditTool(
+            self.canvas,
+            lambda rectangle, points: self.interpolate_all_zone(rectangle, points),
+            self.iface,
+            freehand=self.freehand_action.isChecked())
+        self.canvas.setMapTool(self.interpolate_all_tool)
+        self.iface.messageBar().pushMessage(
+            "Raster Edit Tool",
+            "Click to add points, right-click to finish, ESC to cancel.",
+            level=Qgis.Info
+        )
+        
+    def interpolate_all_zone(self, rectangle, points, preview=True):
+        preview = preview and self.preview_action.isChecked()
+        decimation = self.preview_factor() if preview else 1
+        settings = self.interpolation_settings(decimation, all_values=True)
+        # Calcular limites do bloco (alargados pelo anel de suporte)
+        margin = self.interpolation_margin(settings)
+        context = self.read_edit_block(rectangle, points, 'interpolation', margin, decimation,
+                                       trace_name='interpolate_all_zone')
+        if context is None:
+            return
+    
+        def compute(task):
+            # Motor e SciPy só são importados na primeira interpolação
+            from .engine import interpolate
+            result, context['changed'] = interpolate(
+                context['array'], context['geotransform'], context['vertices'], context['no_data'],
+                checkpoint=task.checkpoint, **settings
+            )
+            return result
+    
+        if preview:
+            self.start_preview_task(context, compute, rectangle, points, self.interpolate_all_zone)
+            return
+        self.start_edit_task(
+            context, "Interpolating all values in area", compute,
+            "Interpolation Completed", "All values in selected area interpolated successfully."
+        )
+
+    def set_freehand(self, enabled):
+        # Aplicar também à ferramenta de desenho ativa
+        tool = self.canvas.mapTool()
+        if isinstance(tool, RasterEditTool):
+            tool.freehand = enabled
+
+    def precision(self):
+        """Precisão de cálculo selecionada no menu ('auto', 'float32' ou 'float64')."""
+        for precision, action in self.precision_actions.items():
+            if action.isChecked():
+                return precision
+        return 'auto'
+
+    def preview_factor(self):
+        """Fator de redução da resolução selecionado para a pré-visualização."""
+        for factor, action in self.preview_factor_actions.items():
+            if action.isChecked():
+                return factor
+        return PREVIEW_FACTORS[0]
+
+    def interpolation_settings(self, decimation=1, all_values=False):
+        """
+        Opções de interpolate_polygon selecionadas na interface. As larguras em
+        píxeis (anel de suporte, tamanho e halo dos mosaicos) são reduzidas
+        para um bloco lido com a resolução reduzida `decimation` vezes, tal
+        como o raio de pesquisa do IDW.
+        """
+        ring_width, tile_size, tile_halo = self.ring_spin.value(), self.tile_size, self.tile_halo
+        idw_radius = self.idw_radius
+        if decimation > 1:
+            ring_width = -(-ring_width // decimation)
+            tile_size = max(tile_size // decimation, 16)
+            tile_halo = max(-(-tile_halo // decimation), 2)
+            idw_radius /= decimation
+        components = self.components_action.isChecked() and not all_values
+        return {
+            'method': self.method_combo.currentText(),
+            'all_values': all_values,
+            'ring_width': ring_width,
+            'components': components,
+            'tiled': self.tiled_action.isChecked() and not components,
+            'tile_size': tile_size,
+            'halo': tile_halo,
+            'precision': self.precision(),
+            'workers': os.cpu_count() or 1,
+            'idw_power': self.idw_power,
+            'idw_neighbors': self.idw_neighbors,
+            'idw_radius': idw_radius
+        }
+
+    def interpolation_margin(self, settings):
+        """Margem (píxeis, resolução total) a ler à volta do polígono."""
+        margin = self.ring_spin.value()
+        if settings['components']:
+            margin = max(margin, COMPONENT_RING_WIDTH)
+        if settings['tiled']:
+            margin = max(margin, self.tile_halo)
+        if settings['method'] == 'idw' and self.idw_radius > 0:
+            # Vizinhos do IDW até ao raio de pesquisa
+            margin = max(margin, int(np.ceil(self.idw_radius)))
+        return margin
+
+    def read_edit_block(self, rectangle, points, operation, margin=0, decimation=1, trace_name=None):
+        """
+        Lê (na thread principal) o bloco afetado por uma edição e devolve o
+        contexto necessário para o cálculo em segundo plano, ou None em caso
+        de erro.
+
+        Com `decimation` > 1 o bloco é lido com a resolução reduzida (apenas
+        para pré-visualização) e a camada não é tornada editável.
+
+        Com `trace_name` é aberto um span da operação completa (leitura,
+        cálculo e escrita), guardado em context['span'] e terminado por
+        start_edit_task quando a tarefa acaba.
+        """
         raster_layer = self.iface.activeLayer()
         if not isinstance(raster_layer, QgsRasterLayer):
             self.iface.messageBar().pushMessage(
@@ -651,113 +868,186 @@ class RasterEditPlugin(QObject):
                 "Please select a raster layer.",
                 level=Qgis.Warning
             )
-            return
+            return None
+        
+        if self.edit_task is not None:
+            self.iface.messageBar().pushMessage(
+                "Warning",
+                "Another edit is still running. Wait for it to finish or cancel it.",
+                level=Qgis.Warning
+            )
+            return None
     
+        operation_span = tracer.begin(trace_name, decimation=decimation) if trace_name else NULL_SPAN
+    
+        # Calcular limites do bloco
+        provider = raster_layer.dataProvider()
+        x_min, y_min, x_max, y_max = self.calculate_bounds(rectangle, provider.xSize(), provider.ySize(), raster_layer, margin)
+        context = self.read_window(raster_layer, x_min, y_min, x_max - x_min + 1, y_max - y_min + 1,
+                                   operation, decimation)
+        if context is None:
+            operation_span.set(error='read')
+            operation_span.end()
+            return None
+        # Vértices copiados para uso fora da thread principal
+        context['vertices'] = [(p.x(), p.y()) for p in points] if points else []
+        context['span'] = operation_span
+        return context
+
+    def read_window(self, raster_layer, x_min, y_min, n_cols, n_rows, operation, decimation=1):
+        """
+        Lê o bloco de n_cols x n_rows píxeis com canto superior esquerdo no
+        píxel (x_min, y_min) e devolve o contexto da edição (ver
+        read_edit_block), ou None em caso de erro.
+        """
         provider = raster_layer.dataProvider()
         try:
-            provider.setEditable(True)
-            no_data_value = provider.sourceNoDataValue(1)
+            if decimation == 1:
+                provider.setEditable(True)
+    
+            # Dimensões lidas (reduzidas na pré-visualização)
+            read_cols = -(-n_cols // decimation)
+            read_rows = -(-n_rows // decimation)
     
-            # Calcular limites do bloco
-            x_min, y_min, x_max, y_max = self.calculate_bounds(rectangle, provider.xSize(), provider.ySize(), raster_layer)
-            
             # Obter o bloco do raster
-            block_extent = QgsRectangle(
-                raster_layer.extent().xMinimum() + x_min * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - y_max * raster_layer.rasterUnitsPerPixelY() - raster_layer.rasterUnitsPerPixelY(),
-                raster_layer.extent().xMinimum() + (x_max + raster_layer.rasterUnitsPerPixelX()) * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - y_min * raster_layer.rasterUnitsPerPixelY()
-            )
+            block_extent = self.block_extent(raster_layer, x_min, y_min, n_cols, n_rows)
+            log_limited('block_extent', logging.DEBUG, "Block extent: %s", block_extent)
     
-            input_block = provider.block(1,
-                                       block_extent,
-                                       int(x_max - x_min + 1),
-                                       int(y_max - y_min + 1))
-    
-            # Detectar o dtype correto do raster
-            native_dtype = qgis_dtype_to_numpy(provider.dataType(1))
-            array = np.frombuffer(input_block.data(), dtype=native_dtype).reshape((y_max - y_min + 1, x_max - x_min + 1))
-            # Guardar tipo original e converter para float64 para operações de interpolação
-            original_dtype = array.dtype
-            array = array.astype(np.float64)
-            
-            # Criar máscara do polígono de forma vetorizada
-            polygon = QgsGeometry.fromPolygonXY([points])
-            y_coords, x_coords = np.meshgrid(
-                np.linspace(block_extent.yMaximum(), block_extent.yMinimum(), array.shape[0]),
-                np.linspace(block_extent.xMinimum(), block_extent.xMaximum(), array.shape[1]),
-                indexing='ij'
+            # Bandas a editar (todas com o mesmo tipo de dados)
+            bands = self.selected_bands(raster_layer)
+            if len({provider.dataType(band) for band in bands}) > 1:
+                raise ValueError("The selected bands have different data types.")
+    
+            with span('read_block', pixels=read_cols * read_rows, bands=len(bands)) as s:
+                array = np.stack([read_block(provider, block_extent, read_cols, read_rows, band) for band in bands])
+                s.set(bytes=array.nbytes)
+    
+        except Exception as e:
+            provider.setEditable(False)
+            logger.error("Error during %s: %s", operation, e)
+            self.iface.messageBar().pushMessage(
+                "Error",
+                f"Error during {operation}: {str(e)}",
+                level=Qgis.Critical
             )
-            
-            points = [QgsPointXY(x, y) for x, y in zip(x_coords.flatten(), y_coords.flatten())]
-            mask = np.array([polygon.contains(p) for p in points]).reshape(array.shape)
-            
-            # Identificar pontos válidos na borda
-            nodata_mask = array == no_data_value
-            valid_mask = ~nodata_mask & ~mask
-            
-            # Interpolar apenas os pontos necessários
-            valid_points = np.column_stack((x_coords[valid_mask], y_coords[valid_mask]))
-            valid_values = array[valid_mask]
-            
-            # Pontos a serem interpolados
-            interp_mask = mask & nodata_mask
-            if np.any(interp_mask):
-                points_to_interpolate = np.column_stack((x_coords[interp_mask], y_coords[interp_mask]))
-                
-                interpolated = griddata(
-                    valid_points,
-                    valid_values,
-                    points_to_interpolate,
-                    method=self.method_combo.currentText(),  # Usar método selecionado
-                    fill_value=no_data_value
+            return None
+    
+        geotransform = self.block_geotransform(raster_layer, x_min, y_min)
+        if decimation > 1:
+            # Píxeis maiores no bloco de resolução reduzida
+            geotransform = (geotransform[0], geotransform[1] * n_cols / read_cols, 0.0,
+                            geotransform[3], 0.0, geotransform[5] * n_rows / read_rows)
+        return {
+            'layer': raster_layer,
+            'provider': provider,
+            'operation': operation,
+            'array': array,
+            'x_min': x_min,
+            'y_min': y_min,
+            'n_cols': n_cols,
+            'n_rows': n_rows,
+            'bands': bands,
+            'data_type': provider.dataType(bands[0]),
+            'no_data': [provider.sourceNoDataValue(band) for band in bands],
+            'decimation': decimation,
+            'extent': block_extent,
+            'geotransform': geotransform
+        }
+
+    def start_edit_task(self, context, description, compute, title, message, on_finished=None):
+        """
+        Lança o cálculo da edição como QgsTask, com barra de progresso e
+        botão de cancelar na barra de mensagens. Por omissão o resultado é
+        escrito por finish_edit_task; `on_finished(result, error)` substitui-o.
+        """
+        if on_finished is None:
+            on_finished = lambda result, error: self.finish_edit_task(context, result, error, title, message)
+    
+        def finished(result, error):
+            # O span da operação engloba o cálculo e a escrita do resultado
+            operation_span = context.get('span', NULL_SPAN)
+            try:
+                on_finished(result, error)
+            finally:
+                if error is not None:
+                    operation_span.set(error=type(error).__name__)
+                elif result is None:
+                    operation_span.set(canceled=True)
+                operation_span.end()
+    
+        task = RasterEditTask(description, traced('compute')(compute), finished)
+    
+        progress_message = self.iface.messageBar().createMessage("Raster Edit", description)
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, 100)
+        progress_message.layout().addWidget(progress_bar)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(task.cancel)
+        progress_message.layout().addWidget(cancel_button)
+        self.iface.messageBar().pushWidget(progress_message, Qgis.Info)
+        task.progressChanged.connect(lambda value: progress_bar.setValue(int(value)))
+    
+        # Manter referências enquanto a tarefa corre
+        self.edit_task = task
+        self.edit_progress = progress_message
+        QgsApplication.taskManager().addTask(task)
+
+    @traced('finish_edit')
+    def finish_edit_task(self, context, result, error, title, message):
+        """
+        Conclui a edição na thread principal: guarda o estado para UNDO,
+        escreve o bloco calculado e redesenha a camada.
+        """
+        self.clear_edit_task()
+    
+        raster_layer = context['layer']
+        provider = context['provider']
+        operation = context['operation']
+        try:
+            if error is not None:
+                raise error
+            if result is None:
+                provider.setEditable(False)
+                self.iface.messageBar().pushMessage(
+                    "Edit Canceled",
+                    "Edit canceled. No changes were written.",
+                    level=Qgis.Info
                 )
-                
-                array[interp_mask] = interpolated
+                return
     
-            # Converter de volta ao tipo original antes de escrever
-            output_block = QgsRasterBlock(provider.dataType(1), x_max - x_min + 1, y_max - y_min + 1)
-            output_block.setData(array.astype(original_dtype).tobytes())
-            success = provider.writeBlock(output_block, 1, x_min, y_min)
-            if not success:
-                raise ValueError("Failed to write raster block.")
+            self.write_edit_block(context, result)
     
             provider.setEditable(False)
-            raster_layer.triggerRepaint()
+            with span('trigger_repaint'):
+                raster_layer.triggerRepaint()
             self.iface.messageBar().pushMessage(
-                "Interpolation Completed",
-                "Raster values interpolated successfully.",
+                title,
+                message,
                 level=Qgis.Success
             )
     
         except Exception as e:
             provider.setEditable(False)
-            logging.error(f"Error during interpolation: {str(e)}")
+            logger.error("Error during %s: %s", operation, e)
             self.iface.messageBar().pushMessage(
                 "Error",
-                f"Error during interpolation: {str(e)}",
+                f"Error during {operation}: {str(e)}",
                 level=Qgis.Critical
             )
 
-    def activate_interpolate_all_tool(self):
-        # Restaurar ícones das outras ferramentas
-        self.suppress_action.setIcon(QIcon(':/plugins/RasterEditPlugin/icons/suppress.png'))
-        self.interpolate_action.setIcon(QIcon(':/plugins/RasterEditPlugin/icons/interpolate.png'))
-        
-        # Ativar ícone desta ferramenta
-        self.interpolate_all_action.setIcon(QIcon(':/plugins/RasterEditPlugin/icons/interpolate_all_active.png'))
-        self.interpolate_all_tool = RasterEditTool(
-            self.canvas,
-            lambda rectangle, points: self.interpolate_all_zone(rectangle, points),
-            self.iface)
-        self.canvas.setMapTool(self.interpolate_all_tool)
-        self.iface.messageBar().pushMessage(
-            "Raster Edit Tool",
-            "Click to add points, right-click to finish, ESC to cancel.",
-            level=Qgis.Info
-        )
-        
-    def interpolate_all_zone(self, rectangle, points):
+    def write_edit_block(self, context, result):
+        """Guarda o estado para UNDO e escreve o bloco calculado."""
+        with span('save_state'):
+            self.save_state(context['layer'], context['x_min'], context['y_min'], context['array'], result,
+                            context['data_type'], context.get('changed'), context['bands'])
+    
+        # Gravar o bloco atualizado
+        with span('write_block', pixels=result.size, bytes=result.nbytes):
+            for band, band_result in zip(context['bands'], result):
+                write_block(context['provider'], band_result, context['data_type'], context['x_min'], context['y_min'], band)
+
+    def run_batch(self):
+        """Edição em lote a partir dos polígonos de uma camada vetorial."""
         raster_layer = self.iface.activeLayer()
         if not isinstance(raster_layer, QgsRasterLayer):
             self.iface.messageBar().pushMessage(
@@ -766,101 +1056,259 @@ class RasterEditPlugin(QObject):
                 level=Qgis.Warning
             )
             return
-    
-        provider = raster_layer.dataProvider()
-        try:
-            provider.setEditable(True)
-            no_data_value = provider.sourceNoDataValue(1)
-    
-            # Calcular limites do bloco
-            x_min, y_min , x_max, y_max = self.calculate_bounds(rectangle, provider.xSize(), provider.ySize(), raster_layer)
-            
-            # Obter o bloco do raster
-            block_extent = QgsRectangle(
-                raster_layer.extent().xMinimum() + x_min * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - y_max * raster_layer.rasterUnitsPerPixelY() - raster_layer.rasterUnitsPerPixelY(),  # subtraindo um pixel extra
-                raster_layer.extent().xMinimum() + (x_max + raster_layer.rasterUnitsPerPixelX()) * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - y_min * raster_layer.rasterUnitsPerPixelY()
+        if self.edit_task is not None:
+            self.iface.messageBar().pushMessage(
+                "Warning",
+                "Another edit is still running. Wait for it to finish or cancel it.",
+                level=Qgis.Warning
             )
+            return
     
-            input_block = provider.block(1, block_extent, int(x_max - x_min + 1), int(y_max - y_min + 1))
-            if not input_block:
-                raise ValueError("Failed to retrieve raster block.")
-            self.save_state(raster_layer, x_min, y_min, input_block)
-    
-            # Detectar o dtype correto do raster
-            native_dtype = qgis_dtype_to_numpy(provider.dataType(1))
-            array = np.frombuffer(input_block.data(), dtype=native_dtype).reshape((y_max - y_min +1, x_max - x_min +1))
-            # Guardar tipo original e converter para float64 para operações de interpolação
-            original_dtype = array.dtype
-            array = array.astype(np.float64)
-            
-            # Criar máscara do polígono de forma vetorizada
-            polygon = QgsGeometry.fromPolygonXY([points])
-            y_coords, x_coords = np.meshgrid(
-                np.linspace(block_extent.yMaximum(), block_extent.yMinimum(), array.shape[0]),
-                np.linspace(block_extent.xMinimum(), block_extent.xMaximum(), array.shape[1]),
-                indexing='ij'
+        vector_layers = [
+            layer for layer in QgsProject.instance().mapLayers().values()
+            if isinstance(layer, QgsVectorLayer) and layer.geometryType() == QgsWkbTypes.PolygonGeometry
+        ]
+        if not vector_layers:
+            self.iface.messageBar().pushMessage(
+                "Warning",
+                "Add a polygon vector layer to the project to use batch editing.",
+                level=Qgis.Warning
             )
-            
-            points = [QgsPointXY(x, y) for x, y in zip(x_coords.flatten(), y_coords.flatten())]
-            mask = np.array([polygon.contains(p) for p in points]).reshape(array.shape)
-            
-            # Identificar pontos válidos fora do polígono
-            valid_mask = ~mask
-            valid_points = np.column_stack((x_coords[valid_mask], y_coords[valid_mask]))
-            valid_values = array[valid_mask]
-            
-            # Interpolar todos os pontos dentro do polígono
-            points_to_interpolate = np.column_stack((x_coords[mask], y_coords[mask]))
-            interpolated = griddata(
-                valid_points,
-                valid_values,
-                points_to_interpolate,
-                method=self.method_combo.currentText(),  # Usar método selecionado
-                fill_value=no_data_value
+            return
+        name, ok = QInputDialog.getItem(
+            self.iface.mainWindow(), "Batch Edit",
+            "Polygon layer:",
+            [layer.name() for layer in vector_layers], 0, False
+        )
+        if not ok:
+            return
+        vector_layer = vector_layers[[layer.name() for layer in vector_layers].index(name)]
+    
+        label, ok = QInputDialog.getItem(
+            self.iface.mainWindow(), "Batch Edit",
+            "Operation:",
+            list(BATCH_OPERATIONS), 0, False
+        )
+        if not ok:
+            return
+    
+        selected_only = False
+        if vector_layer.selectedFeatureCount():
+            choice, ok = QInputDialog.getItem(
+                self.iface.mainWindow(), "Batch Edit",
+                "Features:",
+                [f"Selected features ({vector_layer.selectedFeatureCount()})", "All features"], 0, False
             )
-            
-            array[mask] = interpolated
+            if not ok:
+                return
+            selected_only = choice != "All features"
     
-            # Converter de volta ao tipo original antes de escrever
-            output_block = QgsRasterBlock(provider.dataType(1), x_max - x_min + 1, y_max - y_min + 1)
-            output_block.setData(array.astype(original_dtype).tobytes())
-            success = provider.writeBlock(output_block, 1, x_min , y_min)
-            if not success:
-                raise ValueError("Failed to write raster block.")
+        self.start_batch(raster_layer, vector_layer, BATCH_OPERATIONS[label], selected_only)
+
+    def start_batch(self, raster_layer, vector_layer, operation, selected_only=False):
+        """
+        Agrupa os polígonos pelos mosaicos do raster e processa os grupos um
+        a um: cada grupo é lido, editado em segundo plano e escrito uma vez.
+        """
+        settings = self.interpolation_settings(all_values=operation == INTERPOLATE_ALL)
+        margin = 0 if operation == SUPPRESS else self.interpolation_margin(settings)
+        transform = None
+        if vector_layer.crs() != raster_layer.crs():
+            transform = QgsCoordinateTransform(vector_layer.crs(), raster_layer.crs(), QgsProject.instance())
     
-            provider.setEditable(False)
-            raster_layer.triggerRepaint()
+        features = vector_layer.getSelectedFeatures() if selected_only else vector_layer.getFeatures()
+        windows, rings, skipped = feature_windows(features, raster_layer, margin, transform)
+    
+        if not windows:
             self.iface.messageBar().pushMessage(
-                "Interpolation Completed",
-                "All values in selected area interpolated successfully.",
-                level=Qgis.Success
+                "Batch Edit",
+                "No polygons overlap the raster.",
+                level=Qgis.Warning
+            )
+            return
+    
+        self.batch = {
+            'layer': raster_layer,
+            'operation': operation,
+            'settings': settings,
+            'groups': group_windows(windows),
+            'windows': windows,
+            'rings': rings,
+            'next': 0,
+            'edited': 0,
+            'pixels': 0,
+            'failed': 0,
+            'skipped': skipped,
+            'start': time.perf_counter()
+        }
+        self.run_next_batch_group()
+
+    def run_next_batch_group(self):
+        batch = self.batch
+        if batch['next'] == len(batch['groups']):
+            self.finish_batch()
+            return
+        (x_min, y_min, x_max, y_max), indices = batch['groups'][batch['next']]
+        raster_layer = batch['layer']
+        context = self.read_window(raster_layer, x_min, y_min, x_max - x_min + 1, y_max - y_min + 1, 'batch edit')
+        if context is None:
+            self.batch = None
+            return
+    
+        # Janelas dos polígonos relativas ao bloco do grupo
+        features = group_features(
+            (x_min, y_min), indices, batch['windows'], batch['rings'],
+            self.block_geotransform(raster_layer, 0, 0)
+        )
+    
+        def compute(task):
+            array = context['array'].copy()
+            context['stats'] = apply_features(
+                array, features, context['no_data'], batch['operation'], batch['settings'], task.checkpoint
             )
+            return array
     
+        self.start_edit_task(
+            context, f"Batch edit: tile {batch['next'] + 1} of {len(batch['groups'])}", compute, None, None,
+            on_finished=lambda result, error: self.finish_batch_group(context, result, error)
+        )
+
+    def finish_batch_group(self, context, result, error):
+        """Escreve o bloco de um grupo e passa ao grupo seguinte."""
+        self.clear_edit_task()
+        batch = self.batch
+        provider = context['provider']
+        try:
+            if error is not None:
+                raise error
+            if result is None:
+                provider.setEditable(False)
+                self.batch = None
+                context['layer'].triggerRepaint()
+                self.iface.messageBar().pushMessage(
+                    "Edit Canceled",
+                    f"Batch edit canceled after {batch['next']} of {len(batch['groups'])} tiles.",
+                    level=Qgis.Info
+                )
+                return
+            self.write_edit_block(context, result)
+            provider.setEditable(False)
         except Exception as e:
             provider.setEditable(False)
-            logging.error(f"Error during interpolation: {str(e)}")
+            self.batch = None
+            context['layer'].triggerRepaint()
+            logger.error("Error during batch edit: %s", e)
             self.iface.messageBar().pushMessage(
                 "Error",
-                f"Error during interpolation: {str(e)}",
+                f"Error during batch edit: {str(e)}",
                 level=Qgis.Critical
             )
-        
-    def calculate_bounds(self, rectangle, cols, rows, raster_layer):
-        # Convert map coordinates to pixel coordinates
-        x_min = int((rectangle.xMinimum() - raster_layer.extent().xMinimum()) / raster_layer.rasterUnitsPerPixelX()) 
-        y_min = int((raster_layer.extent().yMaximum() - rectangle.yMaximum()) / raster_layer.rasterUnitsPerPixelY()) 
-        x_max = int((rectangle.xMaximum() - raster_layer.extent().xMinimum()) / raster_layer.rasterUnitsPerPixelX())
-        y_max = int((raster_layer.extent().yMaximum() - rectangle.yMinimum()) / raster_layer.rasterUnitsPerPixelY())
-        
-        # Ensure bounds are within raster dimensions
-        x_min = max(0, min(x_min, cols - 1))
-        y_min = max(0, min(y_min, rows - 1))
-        x_max = max(0, min(x_max, cols - 1))
-        y_max = max(0, min(y_max, rows - 1))
-        
-        return x_min, y_min, x_max, y_max
+            return
+    
+        edited, pixels, failed = context['stats']
+        batch['edited'] += edited
+        batch['pixels'] += pixels
+        batch['failed'] += failed
+        batch['next'] += 1
+        self.run_next_batch_group()
+
+    def finish_batch(self):
+        """Redesenha a camada e mostra o débito do lote."""
+        batch = self.batch
+        self.batch = None
+        batch['layer'].triggerRepaint()
+        elapsed = max(time.perf_counter() - batch['start'], 1e-9)
+        message = (
+            f"{batch['edited']} polygons on {len(batch['groups'])} tiles in {elapsed:.1f} s "
+            f"({batch['edited'] / elapsed:.1f} features/s, {batch['pixels'] / elapsed:,.0f} pixels/s)."
+        )
+        if batch['failed']:
+            message += f" {batch['failed']} polygons had no valid pixels around them and were skipped."
+        if batch['skipped']:
+            message += f" {batch['skipped']} features were not polygons and were skipped."
+        logger.info("Batch edit: %s", message)
+        self.iface.messageBar().pushMessage(
+            "Batch Edit Completed",
+            message,
+            level=Qgis.Success
+        )
+
+    def clear_edit_task(self):
+        self.edit_task = None
+        if self.edit_progress is not None:
+            self.iface.messageBar().popWidget(self.edit_progress)
+            self.edit_progress = None
+
+    def cancel_edit_task(self):
+        if self.edit_task is not None:
+            self.edit_task.cancel()
+
+    def start_preview_task(self, context, compute, rectangle, points, apply):
+        """
+        Calcula em segundo plano a pré-visualização de uma interpolação.
+        `apply(rectangle, points, preview=False)` executa a edição completa
+        quando a pré-visualização é aceite.
+        """
+        self.discard_preview()
+        self.start_edit_task(
+            context, "Computing interpolation preview", compute, None, None,
+            on_finished=lambda result, error: self.show_preview(context, result, error, rectangle, points, apply)
+        )
+
+    def show_preview(self, context, result, error, rectangle, points, apply):
+        """Mostra a pré-visualização sobre o mapa com as ações Apply e Discard."""
+        self.clear_edit_task()
+        if error is not None:
+            logger.error("Error during preview: %s", error)
+            self.iface.messageBar().pushMessage(
+                "Error",
+                f"Error during preview: {str(error)}",
+                level=Qgis.Critical
+            )
+            return
+        if result is None:
+            self.iface.messageBar().pushMessage(
+                "Edit Canceled",
+                "Preview canceled.",
+                level=Qgis.Info
+            )
+            return
+    
+        self.preview_overlay = PreviewOverlay(self.canvas, preview_image(result[0], context['no_data'][0]), context['extent'])
+    
+        message = self.iface.messageBar().createMessage(
+            "Interpolation Preview",
+            f"Showing a 1/{context['decimation']} resolution preview. Apply it at full resolution?"
+        )
+        apply_button = QPushButton("Apply")
+        apply_button.clicked.connect(lambda: self.accept_preview(rectangle, points, apply))
+        message.layout().addWidget(apply_button)
+        discard_button = QPushButton("Discard")
+        discard_button.clicked.connect(self.discard_preview)
+        message.layout().addWidget(discard_button)
+        self.iface.messageBar().pushWidget(message, Qgis.Info)
+        self.preview_message = message
+
+    def accept_preview(self, rectangle, points, apply):
+        self.discard_preview()
+        apply(rectangle, points, preview=False)
+
+    def discard_preview(self):
+        if self.preview_overlay is not None:
+            self.preview_overlay.remove()
+            self.preview_overlay = None
+        if self.preview_message is not None:
+            self.iface.messageBar().popWidget(self.preview_message)
+            self.preview_message = None
+
+    def calculate_bounds(self, rectangle, cols, rows, raster_layer, margin=0):
+        return pixel_bounds(rectangle, cols, rows, raster_layer, margin)
+
+    def block_extent(self, raster_layer, x_min, y_min, n_cols, n_rows):
+        return block_extent(raster_layer, x_min, y_min, n_cols, n_rows)
+
+    def block_geotransform(self, raster_layer, x_min, y_min):
+        return block_geotransform(raster_layer, x_min, y_min)
 
 
     def save_changes(self):
@@ -884,7 +1332,88 @@ class RasterEditPlugin(QObject):
                     level=Qgis.Critical
                 )
                 
+    def configure_log_level(self):
+        levels = list(LOG_LEVELS)
+        current = log_level()
+        level, ok = QInputDialog.getItem(
+            self.iface.mainWindow(), "Log Level",
+            "Messages logged by Raster Edit:",
+            levels, levels.index(current) if current in levels else 0, False
+        )
+        if ok:
+            set_log_level(level)
+
+    def toggle_log_file(self, checked):
+        """Escolhe um ficheiro de registo ou deixa de escrever nele."""
+        if not checked:
+            set_log_file(None)
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self.iface.mainWindow(), "Log to File", "raster-edit.log", "Log files (*.log *.txt)"
+        )
+        if path:
+            try:
+                set_log_file(path)
+                return
+            except OSError as e:
+                self.iface.messageBar().pushMessage(
+                    "Error", f"Cannot open log file: {str(e)}", level=Qgis.Critical
+                )
+        # Repor o estado da ação sem voltar a chamar este método
+        self.log_file_action.blockSignals(True)
+        self.log_file_action.setChecked(False)
+        self.log_file_action.blockSignals(False)
+
+    def toggle_trace(self, checked):
+        """Liga o registo de tempos ou, ao desligar, grava o trace em JSON."""
+        if checked:
+            tracer.start()
+            self.iface.messageBar().pushMessage(
+                "Performance Trace",
+                "Recording. Uncheck Raster Edit > Record Performance Trace to save the trace.",
+                level=Qgis.Info
+            )
+            return
+    
+        events = tracer.stop()
+        path, _ = QFileDialog.getSaveFileName(
+            self.iface.mainWindow(), "Save Performance Trace", "raster-edit-trace.json",
+            "Chrome trace (*.json)"
+        )
+        if not path:
+            return
+        try:
+            write_trace(events, path)
+        except OSError as e:
+            self.iface.messageBar().pushMessage(
+                "Error", f"Error saving trace: {str(e)}", level=Qgis.Critical
+            )
+            return
+        self.iface.messageBar().pushMessage(
+            "Performance Trace",
+            f"{len(events)} events saved to {path}. Open it in ui.perfetto.dev or chrome://tracing.",
+            level=Qgis.Success
+        )
+
+    def report_startup(self):
+        """Regista (nível Info) o tempo gasto pelo plugin no arranque do QGIS."""
+        times = {phase: 1000 * seconds for phase, seconds in self.startup_times.items()}
+        logger.info(
+            "Startup: import %.1f ms, init %.1f ms, initGui %.1f ms (total %.1f ms); SciPy loaded: %s",
+            times.get('import', 0.0), times.get('init', 0.0), times.get('initGui', 0.0),
+            sum(times.values()), 'scipy' in sys.modules
+        )
+
+    def initProcessing(self):
+        """Regista os algoritmos de Processing (também usado pelo qgis_process)."""
+        if self.provider is None:
+            self.provider = RasterEditProvider()
+            QgsApplication.processingRegistry().addProvider(self.provider)
+
     def initGui(self):
+        start = time.perf_counter()
+        self.initProcessing()
+        
         # Criar toolbar dedicada
         self.toolbar = self.iface.addToolBar('Raster Edit')
         self.toolbar.setIconSize(self.iface.iconSize())  # Define o tamanho dos ícones
@@ -896,6 +1425,7 @@ class RasterEditPlugin(QObject):
         self.toolbar.addAction(self.interpolate_action)
         self.toolbar.addAction(self.interpolate_all_action)
         self.toolbar.addAction(self.method_action)
+        self.toolbar.addAction(self.ring_action)
         self.toolbar.addAction(self.undo_action)
         self.toolbar.addAction(self.redo_action)
         self.toolbar.addAction(self.activate_edit_action)
@@ -907,13 +1437,42 @@ class RasterEditPlugin(QObject):
         self.iface.addPluginToMenu('&Raster Edit', self.suppress_action)
         self.iface.addPluginToMenu('&Raster Edit', self.interpolate_action)
         self.iface.addPluginToMenu('&Raster Edit', self.interpolate_all_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.batch_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.freehand_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.components_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.tiled_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.tile_settings_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.idw_settings_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.bands_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.preview_action)
+        for action in self.preview_factor_actions.values():
+            self.iface.addPluginToMenu('&Raster Edit', action)
+        for action in self.precision_actions.values():
+            self.iface.addPluginToMenu('&Raster Edit', action)
         self.iface.addPluginToMenu('&Raster Edit', self.undo_action)
         self.iface.addPluginToMenu('&Raster Edit', self.redo_action)
         self.iface.addPluginToMenu('&Raster Edit', self.activate_edit_action)
         self.iface.addPluginToMenu('&Raster Edit', self.deactivate_edit_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.history_budget_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.trace_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.log_level_action)
+        self.iface.addPluginToMenu('&Raster Edit', self.log_file_action)
+        
+        self.startup_times['initGui'] = time.perf_counter() - start
+        self.report_startup()
 
     
     def unload(self):
+        if self.provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
+            self.provider = None
+        if self.iface is None:
+            return
+        
+        self.cancel_edit_task()
+        self.discard_preview()
+        self.close_journal()
+        
         self.iface.removeToolBarIcon(self.save_action)
         self.iface.removeToolBarIcon(self.suppress_action)
         self.iface.removeToolBarIcon(self.interpolate_action)
@@ -927,10 +1486,34 @@ class RasterEditPlugin(QObject):
         self.iface.removePluginMenu('&Raster Edit', self.suppress_action)
         self.iface.removePluginMenu('&Raster Edit', self.interpolate_action)
         self.iface.removePluginMenu('&Raster Edit', self.interpolate_all_action)
+        self.iface.removePluginMenu('&Raster Edit', self.batch_action)
+        self.iface.removePluginMenu('&Raster Edit', self.freehand_action)
+        self.iface.removePluginMenu('&Raster Edit', self.components_action)
+        self.iface.removePluginMenu('&Raster Edit', self.tiled_action)
+        self.iface.removePluginMenu('&Raster Edit', self.tile_settings_action)
+        self.iface.removePluginMenu('&Raster Edit', self.idw_settings_action)
+        self.iface.removePluginMenu('&Raster Edit', self.bands_action)
+        self.iface.removePluginMenu('&Raster Edit', self.preview_action)
+        for action in self.preview_factor_actions.values():
+            self.iface.removePluginMenu('&Raster Edit', action)
+        for action in self.precision_actions.values():
+            self.iface.removePluginMenu('&Raster Edit', action)
         self.iface.removePluginMenu('&Raster Edit', self.undo_action)
         self.iface.removePluginMenu('&Raster Edit', self.redo_action)
         self.iface.removePluginMenu('&Raster Edit', self.activate_edit_action)
         self.iface.removePluginMenu('&Raster Edit', self.deactivate_edit_action)  # E aqui também
+        self.iface.removePluginMenu('&Raster Edit', self.history_budget_action)
+        self.iface.removePluginMenu('&Raster Edit', self.trace_action)
+        self.iface.removePluginMenu('&Raster Edit', self.log_level_action)
+        self.iface.removePluginMenu('&Raster Edit', self.log_file_action)
+        tracer.stop()
+        set_log_file(None)
+        
+        # Apagar registos de histórico transferidos para disco
+        self.undoStack.clear()
+        self.redoStack.clear()
+        self.history_store.release()
+        triangulation_cache.clear()
         
         
         if hasattr(self, 'toolbar'):
@@ -963,50 +1546,304 @@ class RasterEditPlugin(QObject):
 
 
 
-    def save_state(self, raster_layer, x_min, y_min, block):
+    def save_state(self, raster_layer, x_min, y_min, before, after, data_type, changed, bands):
         """
-        Salva o estado do raster usando coordenadas e número exato de linhas/colunas.
-        Evita salvar estados redundantes.
+        Salva no undoStack apenas os píxeis alterados pela edição (índices em
+        sequências e valores anteriores), na janela mínima que os contém.
+        `changed` é a máscara de alterações devolvida pelo motor, se existir.
+        `before` e `after` têm uma camada por banda de `bands` e todas as
+        bandas ficam num único registo, desfeito de uma só vez.
+        Evita salvar estados sem alterações. A edição é também registada no
+        diário persistente do raster.
         """
-        if not isinstance(block, QgsRasterBlock):
+        state = make_record(x_min, y_min, before, after, data_type, changed, bands)
+        if state is None:
+            # Nenhum píxel foi alterado, ignorar
             return
         
-        # Garantir que temos dados válidos
-        if block.isEmpty():
+        # Verificar redundância com o último estado salvo (comparação de resumos)
+        if self.undoStack and self.undoStack[-1]['digest'] == state['digest']:
             return
         
-        # Criar nova cópia do bloco
-        new_block = QgsRasterBlock(block.dataType(), block.width(), block.height())
-        new_block.setData(block.data())
-    
-        # Verificar redundância com o último estado salvo
-        if self.undoStack and self.undoStack[-1]['block'].data() == new_block.data():
-            # Bloco é idêntico ao último estado, ignorar
-            return
-    
-        # Armazenar novo estado
-        state = {
-            'block': new_block,
-            'x_min': int(x_min),
-            'y_min': int(y_min),
-            'n_cols': block.width(),
-            'n_rows': block.height(),
-            'data_type': block.dataType()
-        }
+        journal = self.journal_for(raster_layer)
+        if journal is not None:
+            journal.record_edit(
+                state['x_min'], state['y_min'], state['n_cols'], state['n_rows'], data_type,
+                state['starts'], state['lengths'], state['values'],
+                record_values(after, x_min, y_min, state), state['digest'], state['bands']
+            )
 
         # Atualizar pilhas
         self.redoStack.clear()
         self.redo_action.setEnabled(False)
         self.undoStack.append(state)
         self.undo_action.setEnabled(True)
+        self.update_history_status()
+
+    def open_journal(self, raster_layer):
+        """
+        Abre o diário persistente do raster. Se já existir um diário de uma
+        sessão anterior, pergunta ao utilizador se quer recuperar o histórico
+        (repondo as edições registadas) ou reverter todas as edições.
+        """
+        path = journal_path(raster_layer.source())
+        if self.journal is not None and self.journal.path == path:
+            return
+        self.close_journal()
+        
+        answer = None
+        try:
+            applied, undone = replay(read_journal(path))
+        except Exception as e:
+            logger.error("Error reading edit journal: %s", e)
+            applied, undone = [], []
+        
+        if applied or undone:
+            answer = QMessageBox.question(
+                self.iface.mainWindow(),
+                "Edit Journal",
+                f"An edit journal was found for this raster with {len(applied)} applied "
+                f"and {len(undone)} undone edits.\n\n"
+                "Yes: restore the undo history (edits are re-applied in case the last "
+                "session was interrupted).\n"
+                "No: roll back all journaled edits.\n"
+                "Cancel: discard the journal.",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+                QMessageBox.Yes
+            )
+            if answer == QMessageBox.Cancel:
+                os.remove(path)
+                applied, undone = [], []
+        
+        try:
+            self.journal = EditJournal(path)
+        except Exception as e:
+            self.journal = None
+            self.iface.messageBar().pushMessage(
+                "Warning",
+                f"Edit journal could not be opened: {str(e)}",
+                level=Qgis.Warning
+            )
+            return
+        
+        if applied or undone:
+            self.restore_journal(raster_layer, applied, undone, answer == QMessageBox.No)
+
+    def restore_journal(self, raster_layer, applied, undone, roll_back):
+        """
+        Repõe (roll forward) as edições aplicadas segundo o diário e reconstrói
+        as pilhas de UNDO/REDO; com `roll_back`, desfaz todas essas edições.
+        """
+        provider = raster_layer.dataProvider()
+        self.undoStack.clear()
+        self.redoStack.clear()
+        try:
+            provider.setEditable(True)
+            for entry in applied:
+                # Reescrever os valores finais é idempotente
+                self.apply_state(raster_layer, entry_record(entry, 'after'))
+                self.undoStack.append(entry_record(entry, 'before'))
+            for entry in reversed(undone):
+                self.redoStack.append(entry_record(entry, 'after'))
+            
+            if roll_back:
+                while self.undoStack:
+                    self.redoStack.append(self.apply_state(raster_layer, self.undoStack.pop()))
+                    self.journal.record_undo()
+            
+            provider.setEditable(False)
+            raster_layer.triggerRepaint()
+            self.iface.messageBar().pushMessage(
+                "Edit Journal",
+                "Journaled edits rolled back." if roll_back else
+                f"Undo history restored ({len(self.undoStack)} edits).",
+                level=Qgis.Info
+            )
+        except Exception as e:
+            provider.setEditable(False)
+            logger.error("Error restoring edit journal: %s", e, exc_info=True)
+            self.iface.messageBar().pushMessage(
+                "Error",
+                f"Error restoring edit journal: {str(e)}",
+                level=Qgis.Critical
+            )
+        
+        self.undo_action.setEnabled(bool(self.undoStack))
+        self.redo_action.setEnabled(bool(self.redoStack))
+        self.update_history_status()
+
+    def journal_for(self, raster_layer):
+        """Diário aberto para o raster indicado, ou None."""
+        if self.journal is None or self.journal.path != journal_path(raster_layer.source()):
+            return None
+        if self.journal.error is not None:
+            self.iface.messageBar().pushMessage(
+                "Warning",
+                f"Edit journal disabled after a write error: {str(self.journal.error)}",
+                level=Qgis.Warning
+            )
+            self.close_journal()
+            return None
+        return self.journal
+
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def update_history_status(self):
+        """Mostra nas dicas de UNDO/REDO a memória ocupada pelo histórico."""
+        usage = (f"{format_bytes(self.history_store.ram_bytes())} in RAM, "
+                 f"{format_bytes(self.history_store.disk_bytes())} on disk")
+        self.undo_action.setToolTip(f"Undo Last Edit ({len(self.undoStack)} edits; {usage})")
+        self.redo_action.setToolTip(f"Redo Last Edit ({len(self.redoStack)} edits; {usage})")
+        return usage
+
+    def configure_history_budget(self):
+        mb = 1024 ** 2
+        ram_budget, ok = QInputDialog.getInt(
+            self.iface.mainWindow(), "History Memory Budget",
+            "Undo history kept in RAM (MB):",
+            self.history_store.ram_budget // mb, 1, 1024 * 1024
+        )
+        if not ok:
+            return
+        disk_budget, ok = QInputDialog.getInt(
+            self.iface.mainWindow(), "History Memory Budget",
+            "Maximum undo history spilled to disk (MB):",
+            self.history_store.disk_budget // mb, 0, 1024 * 1024
+        )
+        if not ok:
+            return
+        
+        self.history_store.ram_budget = ram_budget * mb
+        self.history_store.disk_budget = disk_budget * mb
+        self.history_store.enforce()
+        if not self.undoStack:
+            self.undo_action.setEnabled(False)
+        if not self.redoStack:
+            self.redo_action.setEnabled(False)
+        self.iface.messageBar().pushMessage(
+            "Undo History",
+            f"Current history size: {self.update_history_status()}.",
+            level=Qgis.Info
+        )
+
+    def configure_tiles(self):
+        tile_size, ok = QInputDialog.getInt(
+            self.iface.mainWindow(), "Tiled Interpolation",
+            "Tile size (pixels):",
+            self.tile_size, 16, 65536
+        )
+        if not ok:
+            return
+        tile_halo, ok = QInputDialog.getInt(
+            self.iface.mainWindow(), "Tiled Interpolation",
+            "Halo width around each tile (pixels):",
+            self.tile_halo, 2, 4096
+        )
+        if not ok:
+            return
+        
+        self.tile_size = tile_size
+        self.tile_halo = tile_halo
+
+    def configure_idw(self):
+        power, ok = QInputDialog.getDouble(
+            self.iface.mainWindow(), "IDW Interpolation",
+            "Power (weights are 1 / distance^power):",
+            self.idw_power, 0.1, 10.0, 2
+        )
+        if not ok:
+            return
+        neighbors, ok = QInputDialog.getInt(
+            self.iface.mainWindow(), "IDW Interpolation",
+            "Number of nearest neighbours:",
+            self.idw_neighbors, 1, 256
+        )
+        if not ok:
+            return
+        radius, ok = QInputDialog.getDouble(
+            self.iface.mainWindow(), "IDW Interpolation",
+            "Search radius (pixels, 0 = unlimited):",
+            self.idw_radius, 0.0, 100000.0, 1
+        )
+        if not ok:
+            return
+        
+        self.idw_power = power
+        self.idw_neighbors = neighbors
+        self.idw_radius = radius
+
+    def configure_bands(self):
+        raster_layer = self.iface.activeLayer()
+        band_count = raster_layer.bandCount() if isinstance(raster_layer, QgsRasterLayer) else None
+        text, ok = QInputDialog.getText(
+            self.iface.mainWindow(), "Bands to Edit",
+            "Bands (e.g. 1,2,4-6; empty for all bands):",
+            text=self.edit_bands or ''
+        )
+        if not ok:
+            return
+        text = text.strip()
+        if text.lower() in ('', 'all'):
+            self.edit_bands = None
+            return
+        try:
+            # Sem camada raster ativa, a seleção é validada na próxima edição
+            if band_count is not None:
+                parse_bands(text, band_count)
+        except ValueError as e:
+            self.iface.messageBar().pushMessage("Error", str(e), level=Qgis.Warning)
+            return
+        self.edit_bands = text
 
+    def selected_bands(self, raster_layer):
+        """Bandas de `raster_layer` a editar (ver configure_bands)."""
+        return parse_bands(self.edit_bands or '', raster_layer.bandCount())
+
+    def apply_state(self, raster_layer, state):
+        """
+        Lê a janela do registo, repõe os valores guardados e volta a escrevê-la
+        (read-patch-write). Devolve o registo inverso para a outra pilha.
+        """
+        provider = raster_layer.dataProvider()
+        current_extent = self.block_extent(
+            raster_layer, state['x_min'], state['y_min'], state['n_cols'], state['n_rows']
+        )
+        log_limited('record_extent', logging.DEBUG, "Extensão calculada: %s", current_extent)
     
+        bands = state['bands']
+        with span('read_block', pixels=state['n_cols'] * state['n_rows'], bands=len(bands)) as s:
+            array = np.stack([
+                read_block(provider, current_extent, state['n_cols'], state['n_rows'], band) for band in bands
+            ])
+            s.set(bytes=array.nbytes)
+    
+        # Todas as bandas do registo são repostas de uma só vez
+        with span('swap_record', bytes=state['values'].nbytes):
+            inverse_state = swap_record(array, state)
+    
+        with span('write_block', pixels=array.size, bytes=array.nbytes):
+            for band, band_array in zip(bands, array):
+                write_block(provider, band_array, state['data_type'], state['x_min'], state['y_min'], band)
+        return inverse_state
+    
+    @traced('undo_last_edit')
     def undo_last_edit(self):
-        logging.debug("Iniciando a função undo_last_edit...")
+        logger.debug("Iniciando a função undo_last_edit...")
+        
+        # Não mexer no raster enquanto uma edição corre em segundo plano
+        if self.edit_task is not None:
+            self.iface.messageBar().pushMessage(
+                "Warning", "Wait for the running edit to finish before using Undo.",
+                level=Qgis.Warning
+            )
+            return
     
         # Verificar se há edições para desfazer
         if not self.undoStack:
-            logging.warning("O undoStack está vazio. Não há edições para desfazer.")
+            logger.warning("O undoStack está vazio. Não há edições para desfazer.")
             self.iface.messageBar().pushMessage(
                 "Warning", "No edits to undo.",
                 level=Qgis.Warning
@@ -1014,12 +1851,13 @@ class RasterEditPlugin(QObject):
             return
     
         last_state = self.undoStack.pop()
-        logging.debug(f"Estado recuperado do undoStack: {last_state}")
+        logger.debug("Registo recuperado do undoStack: janela %dx%d em (%d, %d)",
+                     last_state['n_cols'], last_state['n_rows'], last_state['x_min'], last_state['y_min'])
     
         # Obter a camada raster ativa
         raster_layer = self.iface.activeLayer()
         if not isinstance(raster_layer, QgsRasterLayer):
-            logging.error("A camada ativa não é um raster. Operação cancelada.")
+            logger.error("A camada ativa não é um raster. Operação cancelada.")
             self.iface.messageBar().pushMessage(
                 "Error", "Active layer is not a raster.",
                 level=Qgis.Critical
@@ -1030,80 +1868,30 @@ class RasterEditPlugin(QObject):
     
         try:
             # Tornar a camada editável
-            logging.debug("Tornando o raster editável...")
+            logger.debug("Tornando o raster editável...")
             provider.setEditable(True)
     
-            # Validar integridade do bloco do undoStack
-            undo_block = last_state['block']
-            if not isinstance(undo_block, QgsRasterBlock):
-                raise ValueError("Bloco do undoStack não é um QgsRasterBlock válido.")
-    
-            if undo_block.isEmpty():
-                raise ValueError("Bloco do undoStack está vazio.")
-    
-            # Capturar o estado atual para o redoStack
-            logging.debug("Capturando o estado atual para o redoStack...")
-            current_extent = QgsRectangle(
-                raster_layer.extent().xMinimum() + last_state['x_min'] * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - (last_state['y_min'] + last_state['n_rows']) * raster_layer.rasterUnitsPerPixelY(),
-                raster_layer.extent().xMinimum() + (last_state['x_min'] + last_state['n_cols']) * raster_layer.rasterUnitsPerPixelX(),
-                raster_layer.extent().yMaximum() - last_state['y_min'] * raster_layer.rasterUnitsPerPixelY()
-            )
-            logging.debug(f"Extensão calculada: {current_extent.toString()}")
-    
-            current_block = provider.block(
-                1,
-                current_extent,
-                last_state['n_cols'],
-                last_state['n_rows']
-            )
-            if current_block.isEmpty():
-                raise ValueError("Falha ao capturar o estado atual para o redoStack.")
-    
-            # Validar consistência do bloco capturado
-            if (current_block.width() != last_state['n_cols'] or
-                    current_block.height() != last_state['n_rows']):
-                raise ValueError("Dimensões do bloco atual não correspondem ao estado salvo.")
-    
-            logging.debug(f"Bloco capturado para o redoStack: {current_block.width()}x{current_block.height()}")
-    
-            redo_state = {
-                'block': QgsRasterBlock(current_block.dataType(),
-                                        current_block.width(),
-                                        current_block.height()),
-                'x_min': last_state['x_min'],
-                'y_min': last_state['y_min'],
-                'n_cols': last_state['n_cols'],
-                'n_rows': last_state['n_rows'],
-                'data_type': last_state['data_type']
-            }
-            redo_state['block'].setData(current_block.data())
-            logging.debug(f"Estado capturado para o redoStack (dados): {redo_state}")
-    
-            # Adicionar ao redoStack
+            # Repor os píxeis do undoStack e capturar o estado atual para o redoStack
+            logger.debug("Aplicando o registo do undoStack ao raster...")
+            redo_state = self.apply_state(raster_layer, last_state)
             self.redoStack.append(redo_state)
+            logger.debug("Registo do undoStack aplicado com sucesso ao raster.")
     
-            # Aplicar o bloco do undoStack
-            logging.debug("Aplicando o bloco do undoStack ao raster...")
-            success = provider.writeBlock(
-                undo_block, 1,
-                last_state['x_min'],
-                last_state['y_min']
-            )
-            if not success:
-                raise ValueError("Falha ao escrever o bloco do undoStack no raster.")
-    
-            logging.debug("Bloco do undoStack aplicado com sucesso ao raster.")
             provider.setEditable(False)
             raster_layer.triggerRepaint()
-            logging.debug("Repaint do raster acionado.")
+            logger.debug("Repaint do raster acionado.")
     
+            journal = self.journal_for(raster_layer)
+            if journal is not None:
+                journal.record_undo()
+            
             # Habilitar a ação REDO
             self.redo_action.setEnabled(True)
+            self.update_history_status()
     
         except Exception as e:
             provider.setEditable(False)
-            logging.error(f"Erro durante o UNDO: {str(e)}", exc_info=True)
+            logger.error("Erro durante o UNDO: %s", e, exc_info=True)
             self.iface.messageBar().pushMessage(
                 "Error", f"Erro durante o UNDO: {str(e)}",
                 level=Qgis.Critical
@@ -1111,5 +1899,5 @@ class RasterEditPlugin(QObject):
     
         # Desabilitar UNDO se o undoStack estiver vazio
         if not self.undoStack:
-            logging.debug("O undoStack está agora vazio. Desabilitando a ação UNDO.")
+            logger.debug("O undoStack está agora vazio. Desabilitando a ação UNDO.")
             self.undo_action.setEnabled(False)
@@ -0,0 +1,42 @@
+from qgis.core import QgsTask
+
+
+class EditCanceled(Exception):
+    """Sinaliza que o utilizador cancelou a edição em curso."""
+
+
+class RasterEditTask(QgsTask):
+    """
+    Executa a fase de cálculo de uma edição fora da thread principal.
+
+    `compute(task)` corre em segundo plano e não deve tocar em objetos da
+    interface nem no provider. `on_finished(result, error)` é chamado na
+    thread principal quando a tarefa termina; `result` é None se a tarefa
+    falhou ou foi cancelada.
+    """
+
+    def __init__(self, description, compute, on_finished):
+        super().__init__(description, QgsTask.CanCancel)
+        self.compute = compute
+        self.on_finished = on_finished
+        self.result = None
+        self.error = None
+
+    def checkpoint(self, progress):
+        """Atualiza o progresso (0-100) e interrompe a tarefa se foi cancelada."""
+        self.setProgress(progress)
+        if self.isCanceled():
+            raise EditCanceled()
+
+    def run(self):
+        try:
+            self.result = self.compute(self)
+        except EditCanceled:
+            return False
+        except Exception as e:
+            self.error = e
+            return False
+        return not self.isCanceled()
+
+    def finished(self, result):
+        self.on_finished(self.result if result else None, self.error)
@@ -0,0 +1,16 @@
+"""
+Configuração dos testes do motor (sem QGIS).
+
+Como em benchmarks/run.py, o diretório do repositório é registado como o
+pacote `rasteredit`, para importar os módulos do motor sem executar o
+__init__ do plugin (que depende do QGIS).
+"""
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+package = types.ModuleType('rasteredit')
+package.__path__ = [ROOT]
+sys.modules.setdefault('rasteredit', package)
@@ -0,0 +1,155 @@
+"""Testes das edições de várias bandas do motor e dos seus registos."""
+import threading
+
+import numpy as np
+import pytest
+
+from rasteredit import engine, interpolation
+from rasteredit.history import make_record, swap_record
+
+GEOTRANSFORM = (500000.0, 1.0, 0.0, 4000064.0, 0.0, -1.0)
+POLYGON = [(500010.3, 4000050.2), (500052.7, 4000055.1), (500047.4, 4000012.6), (500015.2, 4000020.8)]
+NO_DATA = [-9999.0, -1.0, 0.0]
+
+
+def bands():
+    """Bloco de três bandas com buracos NoData diferentes em cada uma."""
+    y, x = np.mgrid[0:64, 0:64] / 64
+    array = np.stack([np.sin(4 * x) * np.cos(3 * y), x * y + 1, np.cos(5 * x) + 2]).astype(np.float32)
+    array[0, 25:35, 20:40] = NO_DATA[0]
+    array[1, 28:33, 22:30] = NO_DATA[1]
+    array[2, 25:35, 20:40] = NO_DATA[2]
+    array[2, 40:44, 30:34] = NO_DATA[2]
+    return array
+
+
+def test_suppress_uses_each_band_nodata():
+    array = bands()
+    edited, changed = engine.suppress(array, GEOTRANSFORM, POLYGON, NO_DATA)
+    mask = engine.zone_mask(POLYGON, GEOTRANSFORM, array.shape[1:])
+    assert changed.shape == array.shape
+    for band, value in enumerate(NO_DATA):
+        assert (edited[band][mask] == value).all()
+        np.testing.assert_array_equal(edited[band][~mask], array[band][~mask])
+
+
+def test_band_values_requires_one_value_per_band():
+    with pytest.raises(ValueError):
+        engine.suppress(bands(), GEOTRANSFORM, POLYGON, NO_DATA[:2])
+
+
+@pytest.mark.parametrize('options', [
+    {'ring_width': 0},
+    {'ring_width': 4},
+    {'components': True},
+    {'tiled': True, 'tile_size': 16, 'halo': 6},
+], ids=['whole', 'ring', 'components', 'tiled'])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_interpolate_bands_match_single_band(options, workers):
+    array = bands()
+    edited, changed = engine.interpolate(array, GEOTRANSFORM, POLYGON, NO_DATA, method='linear',
+                                         workers=workers, **options)
+    assert changed.shape == array.shape
+    for band, value in enumerate(NO_DATA):
+        single, single_changed = engine.interpolate(array[band], GEOTRANSFORM, POLYGON, value,
+                                                    method='linear', **options)
+        np.testing.assert_array_equal(edited[band], single)
+        np.testing.assert_array_equal(changed[band], single_changed)
+
+
+def test_multiband_record_restores_all_bands_at_once():
+    array = bands()
+    edited, changed = engine.interpolate(array, GEOTRANSFORM, POLYGON, NO_DATA, method='nearest')
+    record = make_record(0, 0, array, edited, 6, changed, bands=[1, 2, 3])
+    assert record['bands'] == [1, 2, 3]
+    assert record['values'].shape[0] == 3
+
+    rows = slice(record['y_min'], record['y_min'] + record['n_rows'])
+    cols = slice(record['x_min'], record['x_min'] + record['n_cols'])
+    window = edited[:, rows, cols].copy()
+    redo = swap_record(window, record)
+    np.testing.assert_array_equal(window, array[:, rows, cols])
+    swap_record(window, redo)
+    np.testing.assert_array_equal(window, edited[:, rows, cols])
+
+
+def test_record_digest_depends_on_bands():
+    array = bands()
+    edited, changed = engine.suppress(array[:2], GEOTRANSFORM, POLYGON, NO_DATA[:2])
+    first = make_record(0, 0, array[:2], edited, 6, changed, bands=[1, 2])
+    second = make_record(0, 0, array[:2], edited, 6, changed, bands=[2, 3])
+    assert first['digest'] != second['digest']
+
+
+def test_band_cache_drops_entries_used_by_every_band(monkeypatch):
+    builds = []
+
+    build_kdtree = interpolation.build_kdtree
+
+    def counting_build(points):
+        builds.append(len(points))
+        return build_kdtree(points)
+
+    monkeypatch.setattr(interpolation, 'build_kdtree', counting_build)
+    cache = interpolation.TriangulationCache(maxsize=2, uses=3)
+    points = [np.random.default_rng(seed).random((20, 2)) for seed in range(4)]
+
+    for _ in range(3):
+        cache.kdtree(points[0])
+    assert len(builds) == 1 and len(cache) == 0
+    # Entradas que nem todas as bandas pedem ficam limitadas por `maxsize`
+    for p in points:
+        cache.kdtree(p)
+    assert len(cache) == 2
+
+
+def test_band_cache_builds_once_for_concurrent_requests(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    builds = []
+
+    def slow_build(points):
+        builds.append(len(points))
+        started.set()
+        release.wait(5)
+        return object()
+
+    monkeypatch.setattr(interpolation, 'build_kdtree', slow_build)
+    cache = interpolation.TriangulationCache(maxsize=4, uses=3)
+    points = np.zeros((5, 2))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.kdtree(points))) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(builds) == 1
+    assert len(results) == 3 and all(result is results[0] for result in results)
+
+
+@pytest.mark.parametrize('options', [{'components': True}, {'tiled': True, 'tile_size': 16, 'halo': 6}],
+                         ids=['components', 'tiled'])
+def test_bands_share_and_release_triangulations(monkeypatch, options):
+    caches = []
+    original = interpolation.TriangulationCache._get
+
+    def tracking_get(self, points, kind, build):
+        value = original(self, points, kind, build)
+        caches.append((id(self), len(self), self.maxsize))
+        return value
+
+    monkeypatch.setattr(interpolation.TriangulationCache, '_get', tracking_get)
+    # Os mesmos buracos em todas as bandas
+    array = bands()
+    holes = array[0] == NO_DATA[0]
+    for band in (1, 2):
+        array[band][array[band] == NO_DATA[band]] = 1.5
+        array[band][holes] = NO_DATA[band]
+    engine.interpolate(array, GEOTRANSFORM, POLYGON, NO_DATA, method='linear', workers=3, **options)
+
+    # Cada triangulação é pedida uma vez por banda e largada depois da última
+    assert caches and len(caches) % 3 == 0
+    assert all(size <= maxsize for _, size, maxsize in caches)
+    assert caches[-1][1] == 0
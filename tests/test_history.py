@@ -0,0 +1,81 @@
+"""Testes dos registos de UNDO/REDO sobre edições reais do motor."""
+import numpy as np
+import pytest
+
+from rasteredit import engine
+from rasteredit.history import decode_runs, encode_runs, make_record, record_digest, swap_record
+
+NO_DATA = -9999.0
+GEOTRANSFORM = (500000.0, 1.0, 0.0, 4000064.0, 0.0, -1.0)
+POLYGON = [(500010.3, 4000050.2), (500052.7, 4000055.1), (500047.4, 4000012.6), (500015.2, 4000020.8)]
+
+
+def surface(dtype='float32'):
+    y, x = np.mgrid[0:64, 0:64] / 64
+    return (100 * np.sin(4 * x) * np.cos(3 * y)).astype(dtype)
+
+
+def undo_redo(before, after, changed):
+    """
+    Desfaz e refaz a edição `before` -> `after` a partir do seu registo, na
+    janela do registo. Devolve (registo, registo inverso, janela desfeita,
+    janela refeita, fatias da janela no bloco).
+    """
+    record = make_record(0, 0, before, after, 0, changed)
+    rows = slice(record['y_min'], record['y_min'] + record['n_rows'])
+    cols = slice(record['x_min'], record['x_min'] + record['n_cols'])
+    window = after[..., rows, cols].copy()
+    redo = swap_record(window, record)
+    undone = window.copy()
+    swap_record(window, redo)
+    return record, redo, undone, window, (rows, cols)
+
+
+def test_runs_round_trip():
+    rng = np.random.default_rng(0)
+    mask = rng.random((37, 53)) < 0.3
+    starts, lengths = encode_runs(mask)
+    np.testing.assert_array_equal(decode_runs(starts, lengths), np.flatnonzero(mask))
+
+
+def test_suppress_round_trip():
+    array = surface()
+    edited, changed = engine.suppress(array, GEOTRANSFORM, POLYGON, NO_DATA)
+    assert changed.any() and (edited[changed] == NO_DATA).all()
+
+    record, redo, undone, redone, window = undo_redo(array, edited, changed)
+    np.testing.assert_array_equal(undone, array[window])
+    np.testing.assert_array_equal(redone, edited[window])
+    # O registo inverso é o que se obteria ao criar o registo da edição inversa
+    assert redo['digest'] == make_record(0, 0, edited, array, 0, changed)['digest']
+
+
+@pytest.mark.parametrize('method', ['linear', 'nearest', 'idw'])
+@pytest.mark.parametrize('all_values', [False, True])
+def test_interpolate_round_trip(method, all_values):
+    array = surface()
+    holed = array.copy()
+    holed[25:35, 20:40] = NO_DATA
+    edited, changed = engine.interpolate(holed, GEOTRANSFORM, POLYGON, NO_DATA, method=method,
+                                         all_values=all_values, ring_width=4)
+    assert changed.any() and not (edited[changed] == NO_DATA).any()
+
+    record, redo, undone, redone, window = undo_redo(holed, edited, changed)
+    np.testing.assert_array_equal(undone, holed[window])
+    np.testing.assert_array_equal(redone, edited[window])
+    assert record['values'].dtype == holed.dtype
+
+
+def test_record_digest_covers_values():
+    array = surface('int16')
+    edited, changed = engine.suppress(array, GEOTRANSFORM, POLYGON, -32768)
+    record = make_record(0, 0, array, edited, 0, changed)
+    assert record_digest(record) == record['digest']
+    record['values'] = record['values'].copy()
+    record['values'][0] += 1
+    assert record_digest(record) != record['digest']
+
+
+def test_unchanged_edit_has_no_record():
+    array = surface()
+    assert make_record(0, 0, array, array.copy(), 0) is None
@@ -0,0 +1,92 @@
+"""Testes da seleção dos pontos de suporte e da interpolação por mosaicos."""
+import numpy as np
+import pytest
+from scipy.ndimage import distance_transform_edt
+
+from rasteredit.interpolation import interpolate_mask, interpolate_tiled, support_ring
+
+
+def reference_ring(target_mask, valid_mask, width):
+    """Anel de referência, com a transformada de distância do bloco inteiro."""
+    return valid_mask & (distance_transform_edt(~target_mask) <= width)
+
+
+@pytest.fixture
+def masks():
+    rng = np.random.default_rng(0)
+    target = np.zeros((60, 80), dtype=bool)
+    target[20:30, 25:45] = True
+    target[5:8, 70:78] = True  # junto à margem do bloco
+    valid = ~target & (rng.random(target.shape) > 0.2)
+    return target, valid
+
+
+@pytest.mark.parametrize('width', [1, 3, 8.5, 40])
+def test_support_ring_matches_reference(masks, width):
+    target, valid = masks
+    np.testing.assert_array_equal(support_ring(target, valid, width), reference_ring(target, valid, width))
+
+
+def test_support_ring_excludes_nodata_and_targets(masks):
+    target, valid = masks
+    ring = support_ring(target, valid, 5)
+    assert ring.any()
+    assert not (ring & ~valid).any()
+    assert not (ring & target).any()
+
+
+def test_support_ring_without_width_keeps_all_valid_pixels(masks):
+    target, valid = masks
+    assert support_ring(target, valid, 0) is valid
+
+
+def test_support_ring_without_targets_is_empty(masks):
+    _, valid = masks
+    assert not support_ring(np.zeros_like(valid), valid, 5).any()
+
+
+def smooth_block(size=96):
+    y, x = np.mgrid[0:size, 0:size] / size
+    return (np.sin(5 * x) * np.cos(4 * y) + x).astype(np.float32)
+
+
+@pytest.mark.parametrize('method', ['linear', 'idw'])
+def test_interpolate_tiled_is_deterministic_and_as_accurate_as_untiled(method):
+    array = smooth_block()
+    target = np.zeros(array.shape, dtype=bool)
+    target[20:70, 15:80] = True
+    source = ~target
+
+    untiled = array.copy()
+    interpolate_mask(untiled, target, source, method, -9999.0, cache=None)
+    results = []
+    for workers in (1, 4, 4):
+        tiled = array.copy()
+        count = interpolate_tiled(tiled, target, source, method, -9999.0, tile_size=16, halo=8,
+                                  workers=workers)
+        assert count > 1
+        results.append(tiled)
+
+    for tiled in results[1:]:
+        np.testing.assert_array_equal(tiled, results[0])
+    np.testing.assert_array_equal(results[0][~target], array[~target])
+    # Erro em relação à superfície original comparável ao da interpolação sem mosaicos
+    tiled_error = np.abs(results[0] - array)[target].mean()
+    untiled_error = np.abs(untiled - array)[target].mean()
+    assert tiled_error < 1.5 * untiled_error
+
+
+def test_interpolate_tiled_keeps_float64_precision():
+    # Num plano a interpolação linear é exata, com ou sem mosaicos
+    y, x = np.mgrid[0:96, 0:96]
+    array = 1000.0 + 0.37 * x - 0.21 * y
+    target = np.zeros(array.shape, dtype=bool)
+    target[20:70, 15:80] = True
+
+    untiled = array.copy()
+    interpolate_mask(untiled, target, ~target, 'linear', -9999.0, cache=None)
+    tiled = array.copy()
+    interpolate_tiled(tiled, target, ~target, 'linear', -9999.0, tile_size=16, halo=8)
+    assert tiled.dtype == np.float64
+    np.testing.assert_allclose(tiled, untiled, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(tiled, array, rtol=0, atol=1e-9)
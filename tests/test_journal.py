@@ -0,0 +1,147 @@
+"""Testes do diário de edições: formato, reposição e recuperação."""
+import zlib
+
+import numpy as np
+import pytest
+
+from rasteredit.history import make_record, record_values, swap_record
+from rasteredit.journal import (ENTRY_MAGIC, EDIT, JOURNAL_MAGIC, REDO, UNDO, _ENTRY_HEADER, EditJournal,
+                                decode_entry, encode_entry, entry_record, read_journal, replay)
+
+
+def entry_arrays(bands=2):
+    rng = np.random.default_rng(0)
+    return {
+        'starts': np.array([0, 7, 19], dtype=np.uint32),
+        'lengths': np.array([3, 5, 2], dtype=np.uint32),
+        'before': rng.standard_normal((bands, 10)).astype(np.float32),
+        'after': rng.integers(-5, 5, (bands, 10)).astype(np.float32),
+    }
+
+
+def split(encoded):
+    """Separa o cabeçalho de uma entrada codificada dos seus dados."""
+    magic, length, crc = _ENTRY_HEADER.unpack_from(encoded)
+    data = encoded[_ENTRY_HEADER.size:]
+    assert magic == ENTRY_MAGIC and length == len(data) and crc == zlib.crc32(data)
+    return data
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float64', 'int16', 'uint8'])
+def test_entry_round_trip(dtype):
+    arrays = entry_arrays()
+    arrays['before'] = arrays['before'].astype(dtype)
+    arrays['after'] = arrays['after'].astype(dtype)
+    meta = {'kind': EDIT, 'time': 1.5, 'x_min': 3, 'y_min': 4, 'n_cols': 5, 'n_rows': 6,
+            'data_type': 6, 'digest': 'abc', 'bands': [1, 3]}
+    entry = decode_entry(split(encode_entry(meta, arrays)))
+
+    assert {key: entry[key] for key in meta} == meta
+    for key, array in arrays.items():
+        assert entry[key].dtype == array.dtype
+        np.testing.assert_array_equal(entry[key], array)
+        # Os arrays descodificados são cópias editáveis
+        assert entry[key].flags.writeable
+
+
+def test_marker_round_trip():
+    meta = {'kind': 'undo', 'time': 2.0}
+    assert decode_entry(split(encode_entry(meta))) == meta
+
+
+def test_corrupted_entry_is_rejected():
+    data = bytearray(split(encode_entry({'kind': EDIT}, entry_arrays())))
+    data[len(data) // 2] ^= 0xFF
+    with pytest.raises(zlib.error):
+        decode_entry(bytes(data))
+
+
+def make_edit(seed, bands=(1, 2)):
+    """Edição sobre uma janela 6 x 8 e o seu registo de UNDO."""
+    rng = np.random.default_rng(seed)
+    before = rng.standard_normal((len(bands), 6, 8)).astype(np.float32)
+    after = before.copy()
+    after[:, 1:4, 2:7] = -9999.0
+    return before, after, make_record(10, 20, before, after, 6, bands=bands)
+
+
+def write_edits(path, edits, markers=()):
+    """Escreve as edições `edits` seguidas dos marcadores UNDO/REDO `markers`."""
+    journal = EditJournal(str(path), sync_interval=0.01)
+    for before, after, record in edits:
+        journal.record_edit(record['x_min'], record['y_min'], record['n_cols'], record['n_rows'],
+                            record['data_type'], record['starts'], record['lengths'], record['values'],
+                            record_values(after, 10, 20, record), record['digest'], record['bands'])
+    for marker in markers:
+        journal.record_undo() if marker == UNDO else journal.record_redo()
+    journal.close()
+    assert journal.error is None
+
+
+def test_journal_replay(tmp_path):
+    path = tmp_path / 'raster.tif.rejournal'
+    edits = [make_edit(seed) for seed in range(3)]
+    write_edits(path, edits, [UNDO, UNDO, REDO])
+
+    applied, undone = replay(read_journal(str(path)))
+    assert [entry['digest'] for entry in applied] == [edits[0][2]['digest'], edits[1][2]['digest']]
+    assert [entry['digest'] for entry in undone] == [edits[2][2]['digest']]
+
+    # Uma nova edição descarta as edições desfeitas
+    write_edits(path, [make_edit(3)])
+    applied, undone = replay(read_journal(str(path)))
+    assert len(applied) == 3 and undone == []
+
+
+def test_journal_ignores_and_truncates_incomplete_tail(tmp_path):
+    path = tmp_path / 'raster.tif.rejournal'
+    write_edits(path, [make_edit(0), make_edit(1)])
+    valid_size = path.stat().st_size
+    # Entrada final cortada a meio, como após uma falha durante a escrita
+    with open(path, 'rb') as f:
+        f.seek(len(JOURNAL_MAGIC))
+        partial = f.read(valid_size - len(JOURNAL_MAGIC))[:40]
+    with open(path, 'ab') as f:
+        f.write(partial)
+
+    assert len(read_journal(str(path))) == 2
+    # Ao reabrir, o diário é cortado na última entrada válida antes de continuar
+    write_edits(path, [make_edit(2)])
+    entries = read_journal(str(path))
+    assert len(entries) == 3
+    assert path.stat().st_size > valid_size
+
+
+def test_read_journal_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a journal')
+    with pytest.raises(ValueError):
+        read_journal(str(path))
+    assert read_journal(str(tmp_path / 'missing.rejournal')) == []
+
+
+def test_entry_record_undo_and_redo(tmp_path):
+    path = tmp_path / 'raster.tif.rejournal'
+    before, after, record = make_edit(0)
+    write_edits(path, [(before, after, record)])
+    (entry,) = read_journal(str(path))
+
+    undo = entry_record(entry, 'before')
+    assert undo['digest'] == record['digest'] and undo['bands'] == [1, 2]
+    # Janela do registo dentro da janela da edição, cujo canto está em (10, 20)
+    rows = slice(record['y_min'] - 20, record['y_min'] - 20 + record['n_rows'])
+    cols = slice(record['x_min'] - 10, record['x_min'] - 10 + record['n_cols'])
+    window = after[:, rows, cols].copy()
+    swap_record(window, undo)
+    np.testing.assert_array_equal(window, before[:, rows, cols])
+    swap_record(window, entry_record(entry, 'after'))
+    np.testing.assert_array_equal(window, after[:, rows, cols])
+
+
+def test_entry_record_checks_digest(tmp_path):
+    path = tmp_path / 'raster.tif.rejournal'
+    write_edits(path, [make_edit(0)])
+    (entry,) = read_journal(str(path))
+    entry['before'][0, 0] += 1
+    with pytest.raises(ValueError):
+        entry_record(entry, 'before')
@@ -0,0 +1,110 @@
+"""Testes das máscaras poligonais e da conversão do valor NoData."""
+import numpy as np
+import pytest
+
+from rasteredit.masking import cast_nodata, polygon_mask, rasterize_polygon, rings_mask
+
+# Geotransform com píxeis de 2 x 0.5 unidades de mapa
+GEOTRANSFORM = (100.0, 2.0, 0.0, 50.0, 0.0, -0.5)
+
+
+def crossings_inside(x, y, ring):
+    """
+    Referência ponto-no-polígono (par-ímpar) por contagem de cruzamentos de
+    um raio para a esquerda, com arestas meio-abertas em y.
+    """
+    inside = False
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        if min(y0, y1) <= y < max(y0, y1):
+            if x0 + (y - y0) * (x1 - x0) / (y1 - y0) <= x:
+                inside = not inside
+    return inside
+
+
+def reference_mask(rings, shape):
+    """Máscara de referência, píxel a píxel, de anéis em espaço de píxeis."""
+    mask = np.zeros(shape, dtype=bool)
+    for row in range(shape[0]):
+        for col in range(shape[1]):
+            mask[row, col] = sum(crossings_inside(col, row, ring) for ring in rings) % 2 == 1
+    return mask
+
+
+def to_map(ring):
+    """Anel em espaço de píxeis (centros inteiros) para coordenadas de mapa."""
+    return [(GEOTRANSFORM[0] + (c + 0.5) * GEOTRANSFORM[1], GEOTRANSFORM[3] + (r + 0.5) * GEOTRANSFORM[5])
+            for c, r in ring]
+
+
+STAR = [(20.3 + r * np.cos(a), 15.6 + r * np.sin(a))
+        for a, r in zip(np.linspace(0, 2 * np.pi, 14, endpoint=False), [13.7, 5.2] * 7)]
+# Anel que se toca a si próprio num vértice (dois lóbulos ligados num ponto)
+FIGURE_EIGHT = [(2.2, 2.3), (16.7, 2.1), (9.4, 12.4), (16.3, 27.6), (2.6, 27.2), (9.4, 12.4)]
+# Anel que volta a passar num vértice anterior, fechando um buraco interior
+KEYHOLE = [(1.3, 1.2), (30.6, 1.4), (30.4, 28.7), (1.2, 28.3), (1.3, 1.2),
+           (10.4, 8.3), (10.6, 20.2), (22.3, 20.4), (22.2, 8.1), (10.4, 8.3)]
+
+
+@pytest.mark.parametrize('ring', [STAR, FIGURE_EIGHT, KEYHOLE], ids=['star', 'figure-eight', 'keyhole'])
+def test_rasterize_polygon_matches_reference(ring):
+    shape = (31, 41)
+    np.testing.assert_array_equal(rasterize_polygon(ring, shape), reference_mask([ring], shape))
+
+
+def test_rasterize_polygon_clips_to_block():
+    ring = [(-10.4, -5.3), (25.7, 3.2), (12.1, 50.6)]
+    shape = (20, 15)
+    np.testing.assert_array_equal(rasterize_polygon(ring, shape), reference_mask([ring], shape))
+
+
+def test_rasterize_polygon_degenerate_rings_are_empty():
+    assert not rasterize_polygon([(1.0, 1.0), (5.0, 5.0)], (8, 8)).any()
+    assert not rasterize_polygon([(1.0, 2.0), (6.0, 2.0), (3.0, 2.0)], (8, 8)).any()
+    assert not rasterize_polygon(STAR, (0, 10)).any()
+
+
+def test_polygon_mask_uses_pixel_centres():
+    shape = (31, 41)
+    np.testing.assert_array_equal(polygon_mask(to_map(STAR), GEOTRANSFORM, shape),
+                                  reference_mask([STAR], shape))
+
+
+def test_rings_mask_opens_holes():
+    outer = [(1.3, 1.2), (38.6, 2.4), (37.4, 29.7), (2.2, 28.3)]
+    hole = [(10.4, 8.3), (10.6, 20.2), (22.3, 20.4), (22.2, 8.1)]
+    island = [(14.1, 12.2), (18.6, 12.3), (18.4, 16.7)]
+    rings = [outer, hole, island]
+    shape = (31, 41)
+    mask = rings_mask([to_map(ring) for ring in rings], GEOTRANSFORM, shape)
+    np.testing.assert_array_equal(mask, reference_mask(rings, shape))
+    assert not mask[14, 12] and mask[13, 17]
+
+
+@pytest.mark.parametrize('value, dtype', [
+    (40000, 'int16'),
+    (-1, 'uint8'),
+    (256, 'uint8'),
+    (1.5, 'int32'),
+    (float('nan'), 'uint16'),
+    (float('inf'), 'int16'),
+    (1e39, 'float32'),
+])
+def test_cast_nodata_rejects_unrepresentable_values(value, dtype):
+    with pytest.raises(ValueError):
+        cast_nodata(value, dtype)
+
+
+@pytest.mark.parametrize('value, dtype', [
+    (-32768, 'int16'),
+    (65535.0, 'uint16'),
+    (-9999, 'float32'),
+    (1e39, 'float64'),
+])
+def test_cast_nodata_keeps_native_type(value, dtype):
+    result = cast_nodata(value, dtype)
+    assert result.dtype == np.dtype(dtype)
+    assert result == value
+
+
+def test_cast_nodata_accepts_nan_for_floats():
+    assert np.isnan(cast_nodata(float('nan'), 'float32'))
@@ -0,0 +1,159 @@
+"""
+Medição de tempos por etapa em eventos Chrome Trace.
+
+Os spans são encaixáveis (with span(...) dentro de outro with span(...)) e
+ficam registados como eventos completos ('ph': 'X') por thread, que o
+chrome://tracing e o Perfetto (ui.perfetto.dev) mostram em árvore. Cada span
+pode levar atributos (píxeis, pontos de suporte, bytes lidos ou escritos).
+
+Uma operação que começa na thread principal, continua numa QgsTask e termina
+quando esta acaba é medida com begin() e end() em vez de um bloco `with`.
+
+Com o registo desligado, span() e begin() devolvem sempre o mesmo objeto
+vazio e o custo resume-se a uma chamada de função.
+
+Este módulo não depende do QGIS.
+"""
+import functools
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan:
+    """
+    Span sem efeito, usado quando o registo está desligado. É falso em
+    contexto booleano, para evitar calcular atributos caros (`if s: s.set(...)`).
+    """
+
+    def __bool__(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def end(self):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, category, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        self.start = None
+        self.ended = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        if not self.ended:
+            self.ended = True
+            self.tracer.add_event(self.name, self.category, self.start, end, self.attributes)
+        return False
+
+    def set(self, **attributes):
+        """Acrescenta atributos conhecidos só depois de o span começar."""
+        self.attributes.update(attributes)
+
+    def end(self):
+        """Termina um span aberto com Tracer.begin (as chamadas seguintes não têm efeito)."""
+        self.__exit__(None, None, None)
+
+
+class Tracer:
+    """Recolhe eventos de spans de todas as threads até serem exportados."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.threads = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def start(self):
+        """Liga o registo, descartando eventos anteriores."""
+        with self._lock:
+            self.events = []
+            self.threads = {}
+            self._origin = time.perf_counter()
+        self.enabled = True
+
+    def stop(self):
+        """Desliga o registo e devolve os eventos recolhidos."""
+        self.enabled = False
+        with self._lock:
+            events, self.events = self.events, []
+            threads, self.threads = self.threads, {}
+        # Nomes das threads, para as distinguir no visualizador
+        events.extend({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                      for tid, name in threads.items())
+        return events
+
+    def span(self, name, category='edit', **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, category, attributes)
+
+    def begin(self, name, category='edit', **attributes):
+        """
+        Abre um span que é terminado mais tarde com end(), na thread em que
+        foi aberto. Serve para operações que continuam em segundo plano e
+        terminam num callback, de modo que o span englobe todas as etapas.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, category, attributes).__enter__()
+
+    def add_event(self, name, category, start, end, attributes):
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self._origin) * 1e6,  # microssegundos
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': attributes,
+        }
+        with self._lock:
+            self.events.append(event)
+            self.threads.setdefault(event['tid'], threading.current_thread().name)
+
+
+def traced(name, category='edit'):
+    """Decorador que mede cada chamada da função num span `name`."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def write_trace(events, path):
+    """Escreve os eventos num ficheiro JSON de Chrome Trace."""
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+# Registo partilhado pelo plugin e pelo motor
+tracer = Tracer()
+span = tracer.span